@@ -28,10 +28,12 @@ class Args(object):
     # Constructor
     def __init__(self, args):
         self.args = {}
+        self.margs = []
 
         for i, arg in enumerate(args[1:]):
             # Stop the first non -- arg
             if arg.find('--') != 0:
+                self.margs = args[i+1:]
                 break;
 
             # Split the argument
@@ -43,5 +45,3 @@ class Args(object):
 
             # Save the dictionary
             self.args[a] = v
-
-        self.margs = args[i+1:]
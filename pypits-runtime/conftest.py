@@ -0,0 +1 @@
+# The tests import libspitz from this directory
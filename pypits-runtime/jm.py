@@ -23,27 +23,95 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS 
 # IN THE SOFTWARE.
 
-from libspitz import JobBinary, SimpleEndpoint
-from libspitz import messaging, config
+from libspitz import JobBinary, JobModule, SimpleEndpoint, TaskPool
+from libspitz import DataCache, TaskBuffer
+from libspitz import Listener
+from libspitz import ResultCache, Liveness, ReorderBuffer, ResultBatch
+from libspitz import JobStatus
+from libspitz import messaging, config, log
 import traceback
 import Args
 import sys, threading, os, time, ctypes, logging, struct, threading, traceback
+import collections, random, copy
+
+try:
+    import Queue as queue # Python 2
+except:
+    import queue # Python 3
 
 # Global configuration parameters
 jm_killtms = None # Kill task managers after execution
+jm_jobid = None # Identifier of the job in the task managers
+jm_module_digest = None # Hash of the module, matched by the task managers
 jm_log_file = None # Output file for logging
+jm_log_level = None # Logging verbosity
+jm_log_sample = None # Log one of every n per-task messages
+jm_log_interval = None # Seconds between per-task log summaries
+jm_log_listener = None # Background thread writing the log
+jm_log_generated = None # Sampled log of generated tasks
+jm_log_pushed = None # Sampled log of pushed tasks
+jm_log_committed = None # Sampled log of committed tasks
 jm_conn_timeout = None # Socket connect timeout
 jm_recv_timeout = None # Socket receive timeout
 jm_send_timeout = None # Socket send timeout
 jm_send_backoff = None # Job Manager delay between sending tasks
 jm_recv_backoff = None # Job Manager delay between sending tasks
+jm_local_workers = None # Workers running inside the job manager process
+jm_deadline = None # Seconds before a running task expires
+jm_heartbeat = None # Seconds between heartbeats to the task managers
+jm_heartbeat_timeout = None # Heartbeat receive timeout
+jm_heartbeat_misses = None # Missed heartbeats before quarantine
+jm_quarantine = None # First quarantine of a dead task manager
+jm_result_cache_dir = None # Directory caching the task results
+jm_result_cache_size = None # Size limit of the result cache
+jm_result_cache = None # Results of previous runs
+jm_result_file = None # File receiving the final result
+jm_ordered = None # Commit the results in task order
+jm_reorder_window = None # Tasks dispatched ahead of the commit point
+jm_reorder_budget = None # Memory budget of the results waiting to commit
+jm_reorder_stall = None # Seconds before the task holding the window is resent
+jm_spill_dir = None # Directory for results beyond the budget
+jm_reorder = None # Results waiting for the tasks before them
+jm_prefetch = None # Tasks generated ahead of the dispatcher
+jm_prefetch_budget = None # Size limit of the tasks generated ahead
+jm_tasks = None # Tasks generated and not dispatched yet
+jm_error = None # Why the job was not committed, if it failed
+jm_batch_count = None # Results committed together
+jm_batch_budget = None # Size limit of the results committed together
+jm_batch_latency = None # Seconds a result waits for its batch
+jm_batch = None # Results waiting to be committed together
+jm_register = None # Let task managers register themselves
+jm_addr = None # Bind address of the registration listener
+jm_port = None # Bind port of the registration listener
+jm_nodes_file = None # List of task managers, seeds the registrations
+jm_monitor = None # Answer the status queries of the monitors
+jm_status = None # Progress of the job, reported to the monitors
+
+# Task managers that could not start the job, by the number of failures
+# and the time they are tried again
+jm_rejects = {}
+
+# Task managers registered with this job manager, with the number
+# of workers and the capabilities they reported, and the endpoint
+# parsed from the list of task managers, if they were seeded from it
+jm_registry = {}
+jm_registry_lock = threading.Lock()
 
 ###############################################################################
 # Parse global configuration
 ###############################################################################
 def parse_global_config(argdict):
-    global jm_killtms, jm_log_file, jm_conn_timeout, jm_recv_timeout, \
-        jm_send_timeout, jm_send_backoff, jm_recv_backoff
+    global jm_killtms, jm_jobid, jm_log_file, jm_conn_timeout, \
+        jm_recv_timeout, jm_send_timeout, jm_send_backoff, jm_recv_backoff, \
+        jm_log_level, jm_log_sample, jm_log_interval, jm_local_workers, \
+        jm_deadline, jm_heartbeat, jm_heartbeat_timeout, \
+        jm_heartbeat_misses, jm_quarantine, \
+        jm_result_cache_dir, jm_result_cache_size, jm_result_file, \
+        jm_ordered, jm_reorder_window, jm_reorder_budget, jm_spill_dir, \
+        jm_reorder_stall, \
+        jm_prefetch, jm_prefetch_budget, jm_batch_count, jm_batch_budget, \
+        jm_batch_latency, \
+        jm_register, jm_addr, jm_port, jm_nodes_file, jm_monitor
 
     def as_int(v):
         if v == None:
@@ -61,35 +129,103 @@ def parse_global_config(argdict):
         return bool(v)
 
     jm_killtms = as_bool(argdict.get('killtms', True))
+    jm_jobid = as_int(argdict.get('jobid', random.getrandbits(62)))
     jm_log_file = argdict.get('log', None)
+    jm_log_level = log.parse_level(argdict.get('loglevel', config.log_level))
+    jm_log_sample = int(argdict.get('logsample', config.log_sample))
+    jm_log_interval = float(argdict.get('loginterval', config.log_interval))
     jm_conn_timeout = as_float(argdict.get('ctimeout', config.conn_timeout))
     jm_recv_timeout = as_float(argdict.get('rtimeout', config.recv_timeout))
     jm_send_timeout = as_float(argdict.get('stimeout', config.send_timeout))
     jm_recv_backoff = as_float(argdict.get('rbackoff', config.recv_backoff))
     jm_send_backoff = as_float(argdict.get('sbackoff', config.send_backoff))
+    jm_local_workers = max(as_int(argdict.get('local-workers', 0)), 0)
+    jm_heartbeat = float(argdict.get('heartbeat', config.heartbeat_interval))
+    jm_heartbeat_timeout = float(argdict.get('hbtimeout',
+        config.heartbeat_timeout))
+    jm_heartbeat_misses = max(int(argdict.get('hbmisses',
+        config.heartbeat_misses)), 1)
+    jm_quarantine = float(argdict.get('quarantine',
+        config.quarantine_backoff))
+    jm_deadline = argdict.get('deadline', config.task_deadline)
+    if jm_deadline != None:
+        jm_deadline = float(jm_deadline)
+        if jm_deadline <= 0:
+            jm_deadline = None
+    jm_result_cache_dir = argdict.get('rcache', None)
+    jm_result_cache_size = as_int(argdict.get('rcachesize',
+        config.result_cache_size))
+    jm_result_file = argdict.get('resultfile', None)
+    jm_ordered = int(argdict.get('ordered', 0)) != 0
+    jm_reorder_window = max(int(argdict.get('window',
+        config.reorder_window)), 1)
+    jm_reorder_budget = as_int(argdict.get('obudget', config.reorder_budget))
+    jm_reorder_stall = max(float(argdict.get('ostall',
+        config.reorder_stall)), 0)
+    jm_spill_dir = argdict.get('spilldir', config.spill_dir)
+
+    # Payloads over the threshold are mapped files in the spill directory,
+    # a threshold of 0 keeps them all in memory
+    config.spill_dir = jm_spill_dir
+    large = int(argdict.get('largepayload', config.large_payload or 0))
+    config.large_payload = large if large > 0 else None
+    config.large_chunk = max(int(argdict.get('largechunk',
+        config.large_chunk)), 1)
+    jm_prefetch = max(int(argdict.get('prefetch', config.prefetch_tasks)), 0)
+    jm_prefetch_budget = as_int(argdict.get('prefetchbudget',
+        config.prefetch_budget))
+    jm_batch_count = max(int(argdict.get('batch', config.commit_batch)), 1)
+    jm_batch_budget = as_int(argdict.get('batchbudget',
+        config.commit_batch_budget))
+    jm_batch_latency = float(argdict.get('batchlatency',
+        config.commit_batch_latency))
+    jm_register = int(argdict.get('register', 0)) != 0
+    jm_addr = argdict.get('jmaddr', '0.0.0.0')
+    jm_port = int(argdict.get('jmport', config.spitz_jm_port))
+    jm_nodes_file = argdict.get('nodes', 'nodes.txt')
+    jm_monitor = int(argdict.get('monitor', 0)) != 0
 
 ###############################################################################
 # Configure the log output format
 ###############################################################################
 def setup_log():
+    global jm_log_listener, jm_log_generated, jm_log_pushed, jm_log_committed
     root = logging.getLogger()
-    root.setLevel(logging.DEBUG)
+    root.setLevel(jm_log_level)
     root.handlers = []
     if jm_log_file == None:
         ch = logging.StreamHandler(sys.stderr)
     else:
         ch = logging.StreamHandler(open(jm_log_file, 'wt'))
-    ch.setLevel(logging.DEBUG)
+    ch.setLevel(jm_log_level)
     formatter = logging.Formatter('%(asctime)s - %(threadName)s - '+
         '%(levelname)s - %(message)s')
     ch.setFormatter(formatter)
-    root.addHandler(ch)
+    jm_log_listener = log.start_async(root, ch)
+
+    # Per-task messages are sampled and summarized
+    jm_log_generated = log.Sampler('tasks generated',
+        jm_log_sample, jm_log_interval)
+    jm_log_pushed = log.Sampler('tasks pushed',
+        jm_log_sample, jm_log_interval)
+    jm_log_committed = log.Sampler('tasks committed',
+        jm_log_sample, jm_log_interval)
+
+###############################################################################
+# Flush the log before leaving
+###############################################################################
+def finish_log():
+    for s in (jm_log_generated, jm_log_pushed, jm_log_committed):
+        if s != None:
+            s.Flush()
+    log.stop_async(jm_log_listener)
 
 ###############################################################################
 # Abort the aplication with message
 ###############################################################################
 def abort(error):
     logging.critical(error)
+    finish_log()
     exit(1)
 
 ###############################################################################
@@ -149,13 +285,28 @@ def parse_node(cmd, proxies):
     raise Exception()
 
 ###############################################################################
-# Load the list of task managers from a file
+# Load the list of task managers from the registrations or from a file
 ###############################################################################
 def load_tm_list(filename = None):
+    # Registered task managers are kept in memory
+    if jm_register and filename == None:
+        with jm_registry_lock:
+            entries = [(name, e[2]) for name, e in jm_registry.items()]
+        tms = {}
+        for name, endpoint in entries:
+            # Each list gets its own copy of the seeded endpoint, as the
+            # job manager and the committer connect at the same time
+            if endpoint != None:
+                tms[name] = copy.copy(endpoint)
+            else:
+                addr, port = name.rsplit(':', 1)
+                tms[name] = SimpleEndpoint(addr, int(port))
+        return tms
+
     # Override the filename if it is empty
     if filename == None:
-        nodefile = 'nodes.txt'
-        filename = os.path.join('.', nodefile)
+        filename = os.path.join('.', jm_nodes_file)
+    nodefile = os.path.basename(filename)
 
     logging.debug('Loading task manager list from %s...' % (nodefile,))
 
@@ -164,7 +315,11 @@ def load_tm_list(filename = None):
         with open(filename, 'rt') as file:
             lines = file.readlines()
     except:
-        logging.warning('Could not load the list of task managers!')
+        # The local workers may run the job alone
+        if jm_local_workers > 0:
+            logging.debug('Could not load the list of task managers.')
+        else:
+            logging.warning('Could not load the list of task managers!')
         return {}
 
     lproxies = [parse_proxy(x.strip()) for x in lines if x[0:5] == 'proxy']
@@ -184,16 +339,109 @@ def load_tm_list(filename = None):
 
     return tms
 
+###############################################################################
+# Add or refresh a task manager in the registrations
+###############################################################################
+def register_tm(name, nw, caps, endpoint = None):
+    with jm_registry_lock:
+        old = jm_registry.get(name, None)
+        known = old != None
+
+        # A seeded task manager keeps the route from the list, such as
+        # a proxy, when it registers itself
+        if endpoint == None and old != None:
+            endpoint = old[2]
+        jm_registry[name] = (nw, caps, endpoint)
+    if not known:
+        logging.info('Task manager %s registered with %s workers (%s).',
+            name, nw if nw != None else 'unknown', ', '.join(caps))
+
+###############################################################################
+# Remove a task manager from the registrations
+###############################################################################
+def deregister_tm(name):
+    with jm_registry_lock:
+        known = jm_registry.pop(name, None) != None
+    if known:
+        logging.info('Task manager %s deregistered.', name)
+
+###############################################################################
+# Listener callback, task managers announce themselves and monitors
+# query the progress of the job here
+###############################################################################
+def registry_callback(conn, addr, port):
+    try:
+        mtype = conn.ReadInt64(jm_recv_timeout)
+
+        if mtype == messaging.msg_register:
+            name = conn.ReadString(jm_recv_timeout)
+            nw = conn.ReadInt64(jm_recv_timeout)
+            ncaps = conn.ReadInt64(jm_recv_timeout)
+            caps = [conn.ReadString(jm_recv_timeout) for i in range(ncaps)]
+            host, tmport = name.rsplit(':', 1)
+            int(tmport)
+            register_tm(name, nw, caps)
+            conn.WriteInt64(messaging.msg_register)
+
+        elif mtype == messaging.msg_deregister:
+            deregister_tm(conn.ReadString(jm_recv_timeout))
+
+        elif mtype == messaging.msg_query_status:
+            # The reply is built from counters only, the task
+            # managers are not contacted
+            detail = conn.ReadInt64(jm_recv_timeout)
+            data = jm_status.Pack(detail != 0)
+            conn.WriteInt64(messaging.msg_query_status)
+            conn.WriteInt64(len(data))
+            conn.Write(data)
+
+        else:
+            logging.warning('Unknown message %d received from %s:%d!',
+                mtype, addr, port)
+    except:
+        logging.warning('Failed to process the message from %s:%d!',
+            addr, port)
+
+    conn.Close()
+
+###############################################################################
+# Start accepting registrations, seeded from the list of task managers,
+# and status queries
+###############################################################################
+def start_registry():
+    if jm_register:
+        filename = os.path.join('.', jm_nodes_file) if jm_nodes_file \
+            else None
+        if filename != None and os.path.exists(filename):
+            for name, endpoint in load_tm_list(filename).items():
+                register_tm(name, None, ['seed'], endpoint)
+        logging.info('Accepting task manager registrations...')
+
+    if jm_monitor:
+        logging.info('Accepting status queries...')
+
+    registry = Listener(config.mode_tcp, jm_addr, jm_port,
+        registry_callback, ())
+    registry.Start()
+    return registry
+
+###############################################################################
+# Connect to a task manager and send a message for this job
+###############################################################################
+def open_endpoint(e, mtype):
+    e.Open(jm_conn_timeout)
+    e.WriteInt64(messaging.msg_select_job)
+    e.WriteInt64(jm_jobid)
+    e.WriteInt64(mtype)
+
 ###############################################################################
 # Exchange messages with an endpoint to begin pushing tasks
 ###############################################################################
 def setup_endpoint_for_pushing(e):
     try:
-        # Try to connect to a task manager
-        e.Open(jm_conn_timeout)
-
-        # Ask if it is possible to send tasks
-        e.WriteInt64(messaging.msg_send_task)
+        # Try to connect to a task manager and
+        # ask if it is possible to send tasks
+        open_endpoint(e, messaging.msg_send_task)
 
         # Wait for a response
         response = e.ReadInt64(jm_recv_timeout)
@@ -205,6 +453,20 @@ def setup_endpoint_for_pushing(e):
             e.Close()
             return 0
 
+        elif response == messaging.msg_unknown_job:
+            # Task manager is not running this job yet
+            logging.debug('Task manager at %s:%d needs the job.',
+                e.address, e.port)
+            e.Close()
+            return response
+
+        elif response == messaging.msg_need_data:
+            # Task manager is waiting for the job data
+            logging.debug('Task manager at %s:%d needs the job data.',
+                e.address, e.port)
+            e.Close()
+            return response
+
         elif response < 0:
             # The task manager is not replying as expected
             logging.error('Unknown response from the task manager!')
@@ -227,11 +489,9 @@ def setup_endpoint_for_pushing(e):
 ###############################################################################
 def setup_endpoint_for_pulling(e):
     try:
-        # Try to connect to a task manager
-        e.Open(jm_conn_timeout)
-
-        # Ask if it is possible to send tasks
-        e.WriteInt64(messaging.msg_read_result)
+        # Try to connect to a task manager and
+        # ask if there are results to read
+        open_endpoint(e, messaging.msg_read_result)
 
         # Wait for a response
         response = e.ReadInt64(jm_recv_timeout)
@@ -259,50 +519,235 @@ def setup_endpoint_for_pulling(e):
     e.Close()
     return False
 
+###############################################################################
+# Start the job in a task manager, the module must be reachable at the
+# same path or already loaded there, returns False if it failed
+###############################################################################
+def send_job(e, filename, argv):
+    started = False
+    try:
+        logging.info('Starting job %d at %s:%d...', jm_jobid,
+            e.address, e.port)
+        open_endpoint(e, messaging.msg_send_job)
+        e.WriteString(filename)
+        e.WriteInt64(len(argv))
+        for arg in argv:
+            e.WriteString(arg)
+        e.WriteInt64(int(jm_deadline * 1000) if jm_deadline != None else 0)
+        e.WriteString(jm_module_digest)
+        if e.ReadInt64(jm_recv_timeout) == 0:
+            logging.error('Task manager at %s:%d could not load %s!',
+                e.address, e.port, filename)
+        else:
+            started = True
+    except:
+        logging.warning('Error sending the job to %s:%d!',
+            e.address, e.port)
+    e.Close()
+    return started
+
+###############################################################################
+# Skip a task manager that could not start the job, for a time doubling
+# at each failure
+###############################################################################
+def reject(machineid):
+    n = jm_rejects.get(machineid, (0, 0))[0] + 1
+    backoff = min(jm_quarantine * 2 ** (n - 1), config.quarantine_max_backoff)
+    jm_rejects[machineid] = (n, time.time() + backoff)
+    logging.warning('Task manager %s could not start the job and will be ' +
+        'skipped for %d seconds.', machineid, backoff)
+
+def rejected(machineid):
+    r = jm_rejects.get(machineid, None)
+    return r != None and time.time() < r[1]
+
+###############################################################################
+# Send the job data to a task manager, unless it is already cached there
+###############################################################################
+def send_job_data(e, jobdata):
+    digest, data = jobdata
+    try:
+        open_endpoint(e, messaging.msg_send_data)
+        e.WriteString(digest)
+        e.WriteInt64(len(data))
+
+        # The task manager only asks for the data it does not have
+        if e.ReadInt64(jm_recv_timeout) != 0:
+            logging.info('Sending %d bytes of job data to %s:%d...',
+                len(data), e.address, e.port)
+            if len(data) > 0:
+                e.WritePayload(data)
+
+        e.ReadInt64(jm_recv_timeout)
+    except:
+        logging.warning('Error sending the job data to %s:%d!',
+            e.address, e.port)
+    e.Close()
+
+###############################################################################
+# Send a task to a remote task manager
+###############################################################################
+def send_task(tm, taskid, task, priority):
+    tm.WriteInt64(taskid)
+    tm.WriteInt64(priority)
+    if task == None:
+        tm.WriteInt64(0)
+    else:
+        tm.WriteInt64(len(task))
+        tm.WritePayload(task)
+
+###############################################################################
+# Send a task to the local workers
+###############################################################################
+def send_local_task(lpool, taskid, task, priority):
+    if not lpool.Put(taskid, task, priority = priority):
+        raise messaging.MessagingError()
+
+###############################################################################
+# Generate a task, returns None when done and False if it failed
+###############################################################################
+def next_task(job, jm, taskid):
+    r1, newtask, ctx = job.spits_job_manager_next_task(jm, taskid)
+
+    if r1 == 0:
+        return None
+
+    if newtask == None:
+        logging.error('Task %d was not pushed!', taskid)
+        return False
+
+    if ctx != taskid:
+        logging.error('Context verification failed for task %d!', taskid)
+        return False
+
+    task = newtask[0]
+    priority = job.spits_job_manager_task_priority(jm, task, taskid)
+    return (taskid, task, priority)
+
+###############################################################################
+# Generator routine, keeps the task buffer filled ahead of the dispatcher
+###############################################################################
+def generator(job, jm, tasks):
+    logging.info('Task generator running...')
+
+    taskid = 0
+    try:
+        while True:
+            item = next_task(job, jm, taskid + 1)
+            if item == None:
+                break
+            if item == False:
+                # Try the same task again
+                time.sleep(jm_send_backoff)
+                continue
+            if not tasks.Put(item, len(item[1]) if item[1] != None else 0):
+                break
+            taskid = item[0]
+    except:
+        # The dispatcher must not take the early end for the last task
+        traceback.print_exc()
+        tasks.Close('The task generator failed after task %d!' % taskid)
+        logging.critical(tasks.error)
+        return
+
+    tasks.Close()
+    logging.info('Task generator finished.')
+
+###############################################################################
+# Send again the task holding the reorder window, the generation does not
+# finish while it waits, so a lost result is never retransmitted otherwise
+###############################################################################
+def resend_head(tasklist, retries):
+    head = jm_reorder.Next()
+    if head not in tasklist or head in retries:
+        return
+    if jm_reorder.Stalled(jm_reorder_stall):
+        logging.warning('The reorder window is waiting for task %d, ' +
+            'pushing it again...', head)
+        retries.append(head)
+
 ###############################################################################
 # Push tasks while the task manager is not full
 ###############################################################################
-def push_tasks(job, jm, tm, taskid, task, taskms, tasklist, tosend, machineid):
+def push_tasks(job, jm, send, taskid, task, taskms, tasklist, tosend,
+    machineid, hqueue, retries):
     # Keep pushing until finished or the task manager is full
     sent = []
     while tosend > 0:
+        # Tasks that expired or were lost are sent again before the new ones
+        if task == None and len(retries) > 0:
+            rtaskid = retries.popleft()
+            p = tasklist.get(rtaskid, None)
+            if p == None:
+                continue
+            try:
+                logging.info('Pushing task %d again...', rtaskid)
+                send(rtaskid, p[1], p[3] + config.priority_retry)
+            except:
+                retries.appendleft(rtaskid)
+                break
+            jm_status.Retransmitted()
+            p[2].add(machineid)
+            sent.append((rtaskid, p[1], p[2]))
+            tosend = tosend - 1
+            continue
+
         if task == None:
-            # Only get a task if the last one was already sent
-            newtaskid = taskid + 1
-            r1, newtask, ctx = job.spits_job_manager_next_task(jm, newtaskid)
-            
+            # In ordered mode, stop generating while the results
+            # ahead of the commit point fill the reorder window
+            if jm_reorder != None and jm_reorder.Full(taskid + 1):
+                resend_head(tasklist, retries)
+                break
+
+            # Only get a task if the last one was already sent, from
+            # the generator running ahead if there is one
+            if jm_tasks != None:
+                item = jm_tasks.Get()
+            else:
+                item = next_task(job, jm, taskid + 1)
+
             # Exit if done
-            if r1 == 0:
+            if item == None:
                 return (True, 0, None, set(), sent)
-            
-            if newtask == None:
-                logging.error('Task %d was not pushed!', newtaskid)
-                return (False, taskid, task, taskms, sent)
 
-            if ctx != newtaskid:
-                logging.error('Context verification failed for task %d!', 
-                    newtaskid)
+            if item == False:
                 return (False, taskid, task, taskms, sent)
 
             # Add the generated task to the tasklist
-            taskid = newtaskid
-            task = newtask[0]
+            taskid, task, priority = item
             taskms = set()
-            tasklist[taskid] = (0, task)
+            tasklist[taskid] = (0, task, taskms, priority)
+            jm_status.Generated()
 
-            logging.debug('Generated task %d with payload size of %d bytes.', 
+            jm_log_generated.Log(logging.DEBUG,
+                'Generated task %d with payload size of %d bytes.',
                 taskid, len(task) if task != None else 0)
 
+            # Commit the result of an identical task directly
+            if hqueue != None and job.spits_task_cacheable(task):
+                res = jm_result_cache.Get(jm_result_cache.Key(task))
+                if res != None:
+                    jm_log_pushed.Log(logging.DEBUG,
+                        'Task %d found in the result cache.', taskid)
+                    taskms.add('cache')
+                    hqueue.put((taskid, 0, res))
+                    task = None
+                    continue
+
         try:
-            logging.debug('Pushing task %d...', taskid)
+            jm_log_pushed.Log(logging.DEBUG, 'Pushing task %d...', taskid)
+
+            # Replicas of a task already sent to another task
+            # manager are executed before the new tasks
+            priority = tasklist.get(taskid, (0, None, None, taskid))[3]
+            again = len(taskms) > 0
+            if again:
+                priority = priority + config.priority_retry
 
             # Push the task to the active task manager
-            tm.WriteInt64(taskid)
-            if task == None:
-                tm.WriteInt64(0)
-            else:
-                tm.WriteInt64(len(task))
-                tm.Write(task)
+            send(taskid, task, priority)
+            if again:
+                jm_status.Retransmitted()
 
             # Continue pushing tasks
             taskms.add(machineid)
@@ -317,10 +762,148 @@ def push_tasks(job, jm, tm, taskid, task, taskms, tasklist, tosend, machineid):
 
     return (False, taskid, task, taskms, sent)
 
+###############################################################################
+# Commit a result received from a worker
+###############################################################################
+def commit_task(job, co, taskid, r, res, tasklist, completed, total,
+    machineid, cancels, retries):
+    # Warning, exceptions in this function may cause task loss
+    # if not handled properly!!
+
+    if r == messaging.res_module_timeout:
+        # The task is not committed, the job manager sends it again
+        # and the task manager may also receive it again
+        p = tasklist.get(taskid, None)
+        if p != None:
+            logging.warning('The task %d expired at %s and will be ' +
+                'rescheduled!', taskid, machineid)
+            p[2].discard(machineid)
+            retries.append(taskid)
+        return total
+
+    if r == messaging.res_module_error:
+        logging.error('The remote worker crashed while ' +
+            'executing task %d!', r)
+    elif r != 0:
+        logging.error('The task %d was not successfully executed, ' +
+            'worker returned %d!', taskid, r)
+
+    # Validated completed task
+    c = completed.get(taskid, (None, None))
+
+    if c[0] != None:
+        # This may happen with the fault tolerance system. This may
+        # lead to tasks being put in the tasklist by the job manager
+        # while being committed. The tasklist must be constantly
+        # sanitized.
+        logging.warning('The task %d was received more than once ' +
+            'and will not be committed again!',
+            taskid)
+        # Removed the completed task from the tasklist
+        tasklist.pop(taskid, (None, None, None, None))
+        return total
+
+    # Remove it from the tasklist
+
+    p = tasklist.pop(taskid, (None, None, None, None))
+    if p[0] == None and c[0] == None:
+        # The task was not already completed and was not scheduled
+        # to be executed, this is serious problem!
+        logging.error('The task %d was not in the working list!',
+            taskid)
+
+    # Cancel the copies sent to other task managers
+    if p[2] != None:
+        for m in list(p[2]):
+            if m != machineid:
+                cancels.setdefault(m, []).append(taskid)
+
+    # Keep the successful results for the next runs
+    if jm_result_cache != None and r == 0 and p[0] != None and \
+        machineid != 'cache' and job.spits_task_cacheable(p[1]):
+        jm_result_cache.Put(jm_result_cache.Key(p[1]), res)
+
+    # Add completed task to list
+    completed[taskid] = (r, None)
+    jm_status.Completed(machineid)
+    if jm_reorder == None:
+        return commit_pit(job, co, taskid, r, res, completed, total)
+
+    # In ordered mode, commit it after the tasks before it
+    jm_reorder.Put(taskid, r, res)
+    while True:
+        ready = jm_reorder.Pop()
+        if ready == None:
+            return total
+        total = commit_pit(job, co, ready[0], ready[1], ready[2],
+            completed, total)
+
+###############################################################################
+# Pass a validated result to the committer
+###############################################################################
+def commit_pit(job, co, taskid, r, res, completed, total):
+    # Hold the result until its batch is full
+    if jm_batch != None:
+        if jm_batch.Add(taskid, r, res):
+            return commit_batch(job, co, completed, total)
+        return total
+
+    r2 = job.spits_committer_commit_pit(co, res)
+    total = total + 1
+    jm_status.Committed()
+
+    if r2 != 0:
+        logging.error('The task %d was not successfully committed, ' +
+            'committer returned %d', taskid, r2)
+
+    completed[taskid] = (r, r2)
+    jm_log_committed.Log(logging.DEBUG,
+        'Task %d successfully committed, %d tasks committed.',
+        taskid, total)
+    return total
+
+###############################################################################
+# Pass the batched results to the committer at once
+###############################################################################
+def commit_batch(job, co, completed, total):
+    if jm_batch == None or len(jm_batch) == 0:
+        return total
+
+    pits = jm_batch.Take()
+    r2 = job.spits_committer_commit_pits(co, [p[2] for p in pits])
+    jm_status.Committed(len(pits))
+
+    if r2 != 0:
+        logging.error('The batch of %d tasks starting at task %d was not ' +
+            'successfully committed, committer returned %d',
+            len(pits), pits[0][0], r2)
+
+    for taskid, r, res in pits:
+        total = total + 1
+        completed[taskid] = (r, r2)
+        jm_log_committed.Log(logging.DEBUG,
+            'Task %d successfully committed, %d tasks committed.',
+            taskid, total)
+    return total
+
+###############################################################################
+# Commit the results completed by the local workers or found in the cache
+###############################################################################
+def commit_local_tasks(job, co, lqueue, tasklist, completed, total,
+    machineid, cancels, retries):
+    while True:
+        try:
+            taskid, r, res = lqueue.get_nowait()
+        except queue.Empty:
+            return total
+        total = commit_task(job, co, taskid, r, res, tasklist,
+            completed, total, machineid, cancels, retries)
+
 ###############################################################################
 # Read and commit tasks while the task manager is not empty
 ###############################################################################
-def commit_tasks(job, co, tm, tasklist, completed, torecv, total):
+def commit_tasks(job, co, tm, tasklist, completed, torecv, total,
+    machineid, cancels, retries):
     # Keep pulling until finished or the task manager is full
     while torecv > 0:
         try:
@@ -329,69 +912,126 @@ def commit_tasks(job, co, tm, tasklist, completed, torecv, total):
 
             if taskid == messaging.msg_read_empty:
                 # No more task to receive
-                return
+                return total
 
             # Read the rest of the task
             r = tm.ReadInt64(jm_recv_timeout)
             ressz = tm.ReadInt64(jm_recv_timeout)
-            res = tm.Read(ressz, jm_recv_timeout)
+            res = tm.ReadPayload(ressz, jm_recv_timeout)
             torecv = torecv-1
 
-            # Warning, exceptions after this line may cause task loss
-            # if not handled properly!!
-
-            if r == messaging.res_module_error:
-                logging.error('The remote worker crashed while ' +
-                    'executing task %d!', r)
-            elif r != 0:
-                logging.error('The task %d was not successfully executed, ' +
-                    'worker returned %d!', taskid, r)
-
-            # Validated completed task
-            c = completed.get(taskid, (None, None))
-
-            if c[0] != None:
-                # This may happen with the fault tolerance system. This may
-                # lead to tasks being put in the tasklist by the job manager
-                # while being committed. The tasklist must be constantly
-                # sanitized.
-                logging.warning('The task %d was received more than once ' +
-                    'and will not be committed again!',
-                    taskid)
-                # Removed the completed task from the tasklist
-                tasklist.pop(taskid, (None, None))
-                continue
-
-            # Remove it from the tasklist
-
-            p = tasklist.pop(taskid, (None, None))
-            if p[0] == None and c[0] == None:
-                # The task was not already completed and was not scheduled
-                # to be executed, this is serious problem!
-                logging.error('The task %d was not in the working list!',
-                    taskid)
-
-            r2 = job.spits_committer_commit_pit(co, res)
-            total = total + 1
-
-            if r2 != 0:
-                logging.error('The task %d was not successfully committed, ' +
-                    'committer returned %d', taskid, r2)
-
-            # Add completed task to list
-            completed[taskid] = (r, r2)
-            logging.debug('Task %d successfully committed.', taskid)
-            logging.debug('%d tasks committed.', total)
+            total = commit_task(job, co, taskid, r, res, tasklist,
+                completed, total, machineid, cancels, retries)
         except:
             # Something went wrong with the connection,
             # try with another task manager
             break
     return total
 
+###############################################################################
+# Cancel the tasks still queued in the task managers
+###############################################################################
+def send_cancels(cancels, tmlist, lpool):
+    for machineid, taskids in cancels.items():
+        if machineid == 'local':
+            n = lpool.Cancel(taskids)
+            logging.debug('Cancelled %d local tasks.', n)
+            continue
+
+        tm = tmlist.get(machineid, None)
+        if tm == None:
+            continue
+
+        try:
+            logging.debug('Cancelling %d tasks at %s...',
+                len(taskids), machineid)
+            open_endpoint(tm, messaging.msg_cancel_task)
+            tm.WriteInt64(len(taskids))
+            for taskid in taskids:
+                tm.WriteInt64(taskid)
+        except:
+            # Cancelling is only an optimization, the duplicated
+            # results are still discarded when received
+            logging.warning('Error cancelling tasks at %s!', machineid)
+        tm.Close()
+
+    cancels.clear()
+
+###############################################################################
+# List the task managers to visit in a round, the local workers, if any,
+# are listed first with no endpoint, quarantined task managers are skipped
+###############################################################################
+def list_targets(tmlist, local, liveness = None):
+    targets = [('%s:%d' % (tm.address, tm.port), tm) for tm in tmlist.values()]
+    if liveness != None:
+        targets = [t for t in targets if liveness.Available(t[0])]
+    if local != None:
+        targets.insert(0, ('local', None))
+    return targets
+
+###############################################################################
+# Check if a task manager is alive, returns the id of its run
+###############################################################################
+def ping(tm):
+    try:
+        tm.Open(jm_heartbeat_timeout)
+        tm.WriteInt64(messaging.msg_heartbeat)
+        instance = tm.ReadInt64(jm_heartbeat_timeout)
+    except:
+        instance = None
+    tm.Close()
+    return instance
+
+###############################################################################
+# Send again the tasks in flight at a task manager that died
+###############################################################################
+def reschedule(machineid, tasklist, retries):
+    n = 0
+    for taskid, p in list(tasklist.items()):
+        if machineid in p[2]:
+            p[2].discard(machineid)
+            retries.append(taskid)
+            n += 1
+    return n
+
+###############################################################################
+# Heartbeat routine, tracks the liveness of the task managers
+###############################################################################
+def heartbeat(tasklist, completed, liveness, retries):
+    logging.info('Heartbeat running...')
+
+    while not (len(tasklist) == 0 and completed[0] == 1):
+        for machineid, tm in list_targets(load_tm_list(), None):
+            if not liveness.Due(machineid):
+                continue
+
+            instance = ping(tm)
+            if instance == None:
+                if liveness.Missed(machineid):
+                    n = reschedule(machineid, tasklist, retries)
+                    logging.warning('Task manager %s is dead, %d tasks ' +
+                        'rescheduled.', machineid, n)
+                else:
+                    logging.debug('Task manager %s missed a heartbeat.',
+                        machineid)
+                jm_status.Alive(machineid, liveness.Available(machineid))
+                continue
+
+            if not liveness.Available(machineid):
+                logging.info('Task manager %s is back.', machineid)
+            if liveness.Alive(machineid, instance):
+                n = reschedule(machineid, tasklist, retries)
+                logging.warning('Task manager %s restarted, %d tasks ' +
+                    'rescheduled.', machineid, n)
+            jm_status.Alive(machineid, True)
+
+        time.sleep(jm_heartbeat)
+
 ###############################################################################
 # Job Manager routine
 ###############################################################################
-def jobmanager(argv, job, jm, tasklist, completed):
+def jobmanager(argv, job, jm, tasklist, completed, lpool, hqueue, retries,
+    liveness, jobdata):
     logging.info('Job manager running...')
 
     # Load the list of nodes to connect to
@@ -414,18 +1054,17 @@ def jobmanager(argv, job, jm, tasklist, completed):
             newtmlist = load_tm_list()
             if len(newtmlist) > 0:
                 tmlist = newtmlist
-            else:
+            elif lpool == None:
                 logging.warning('New list of task managers is ' +
                     'empty and will not be updated!')
         except:
             logging.error('Failed parsing task manager list!')
 
-        for name, tm in tmlist.items():
-            logging.debug('Connecting to %s:%d...', tm.address, tm.port)
+        for machineid, tm in list_targets(tmlist, lpool, liveness):
+            logging.debug('Connecting to %s...', machineid)
 
-            machineid = '%s:%d' % (tm.address, tm.port)
             if task != None and machineid in taskms:
-                logging.debug('The task %d will not be submitted to the same tm %s:%d again!', taskid, tm.address, tm.port)
+                logging.debug('The task %d will not be submitted to the same tm %s again!', taskid, machineid)
 
                 # Exit the job manager when done
                 if len(tasklist) == 0 and completed[0] == 1:
@@ -434,30 +1073,55 @@ def jobmanager(argv, job, jm, tasklist, completed):
                 continue
 
             # Open the connection to the task manager and query if it is
-            # possible to send data
-            tosend = setup_endpoint_for_pushing(tm)
+            # possible to send data, the local workers are fed directly
+            if tm == None:
+                tosend = lpool.Free()
+                send = lambda i, t, p: send_local_task(lpool, i, t, p)
+            else:
+                if rejected(machineid):
+                    continue
+                tosend = setup_endpoint_for_pushing(tm)
+                if tosend == messaging.msg_unknown_job:
+                    if not send_job(tm, job.filename, argv):
+                        reject(machineid)
+                        continue
+                    jm_rejects.pop(machineid, None)
+                    tosend = setup_endpoint_for_pushing(tm)
+                if tosend == messaging.msg_need_data:
+                    send_job_data(tm, jobdata)
+                    tosend = setup_endpoint_for_pushing(tm)
+                send = lambda i, t, p: send_task(tm, i, t, p)
+            jm_status.Free(machineid, max(tosend, 0))
+            if tosend < 0:
+                continue
             if tosend == 0:
                 continue
 
-            logging.debug('Pushing %d tasks to %s:%d...', tosend, tm.address, tm.port)
+            logging.debug('Pushing %d tasks to %s...', tosend, machineid)
 
             # Task pushing loop
-            finished, taskid, task, taskms, sent = push_tasks(job, jm, tm,
-                taskid, task, taskms, tasklist, tosend, machineid)
+            finished, taskid, task, taskms, sent = push_tasks(job, jm, send,
+                taskid, task, taskms, tasklist, tosend, machineid, hqueue,
+                retries)
 
             # Add the sent tasks to the sumission list
             submissions = submissions + sent
 
             # Close the connection with the task manager
-            tm.Close()
+            if tm != None:
+                tm.Close()
 
-            logging.debug('Finished pushing tasks to %s:%d.',
-                tm.address, tm.port)
+            logging.debug('Finished pushing tasks to %s.', machineid)
 
             if finished and completed[0] == 0:
-                # Tell everyone the task generation was completed
-                logging.info('All tasks generated.')
+                # Tell everyone the task generation was completed, the
+                # tasks already sent are committed even if it failed
+                if jm_tasks != None and jm_tasks.error != None:
+                    logging.error('The task generation stopped early!')
+                else:
+                    logging.info('All tasks generated.')
                 completed[0] = 1
+                jm_status.Finished()
 
             # Exit the job manager when done
             if len(tasklist) == 0 and completed[0] == 1:
@@ -486,62 +1150,148 @@ def jobmanager(argv, job, jm, tasklist, completed):
         # Remove the committed tasks from the submission list
         submissions = [x for x in submissions if x[0] in tasklist]
 
+        # Exit the job manager when done
+        if len(tasklist) == 0 and completed[0] == 1:
+            return
+
         time.sleep(jm_send_backoff)
 
 ###############################################################################
 # Committer routine
 ###############################################################################
-def committer(argv, job, co, tasklist, completed):
+def committer(argv, job, co, tasklist, completed, lpool, lqueue, hqueue,
+    retries, liveness):
     logging.info('Committer running...')
 
     # Load the list of nodes to connect to
     tmlist = load_tm_list()
     total = 0
+    cancels = {} # Tasks to cancel for each task manager
 
     # Result pulling loop
     while True:
+        # Results found in the cache skip the task managers
+        if hqueue != None:
+            total = commit_local_tasks(job, co, hqueue, tasklist,
+                completed, total, 'cache', cancels, retries)
+
         # Reload the list of task managers at each
         # run so new tms can be added on the fly
         try:
             newtmlist = load_tm_list()
             if len(newtmlist) > 0:
                 tmlist = newtmlist
-            else:
+            elif lqueue == None:
                 logging.warning('New list of task managers is ' +
                     'empty and will not be updated!')
         except:
             logging.error('Failed parsing task manager list!')
 
-        for name, tm in tmlist.items():
-            logging.debug('Connecting to %s:%d...', tm.address, tm.port)
+        for machineid, tm in list_targets(tmlist, lqueue, liveness):
+            # Results from the local workers are already in memory
+            if tm == None:
+                jm_status.Backlog(machineid, lqueue.qsize())
+                total = commit_local_tasks(job, co, lqueue, tasklist,
+                    completed, total, 'local', cancels, retries)
+                continue
+
+            logging.debug('Connecting to %s...', machineid)
 
             # Open the connection to the task manager and query if it is
             # possible to send data
             torecv = setup_endpoint_for_pulling(tm)
+            jm_status.Backlog(machineid, int(torecv))
             if torecv == 0:
                 continue
 
-            logging.debug('Pulling %d tasks from %s:%d...', torecv, tm.address, tm.port)
+            logging.debug('Pulling %d tasks from %s...', torecv, machineid)
 
             # Task pulling loop
-            total = commit_tasks(job, co, tm, tasklist, completed, torecv, total)
+            total = commit_tasks(job, co, tm, tasklist, completed, torecv,
+                total, machineid, cancels, retries)
 
             # Close the connection with the task manager
             tm.Close()
 
-            logging.debug('Finished pulling tasks from %s:%d.',
-                tm.address, tm.port)
+            logging.debug('Finished pulling tasks from %s.', machineid)
 
             if len(tasklist) == 0 and completed[0] == 1:
+                total = commit_batch(job, co, completed, total)
                 logging.info('All tasks committed.')
                 return
 
+        # Do not keep the batched results waiting for too long
+        if jm_batch != None and jm_batch.Due():
+            total = commit_batch(job, co, completed, total)
+
+        # Stop the other copies of the committed tasks
+        if len(cancels) > 0:
+            send_cancels(cancels, tmlist, lpool)
+
         # Refresh the tasklist
         for taskid in completed:
             tasklist.pop(taskid, 0)
 
+        # The last results may have been committed before the job
+        # manager flagged the end of the generation
+        if len(tasklist) == 0 and completed[0] == 1:
+            total = commit_batch(job, co, completed, total)
+            logging.info('All tasks committed.')
+            return
+
         time.sleep(jm_recv_backoff)
 
+###############################################################################
+# Initializer routine for the local workers
+###############################################################################
+def local_initializer(lqueue, job, argv, jobinfo):
+    logging.info('Initializing local worker...')
+    return job.spits_worker_new_with_data(argv, jobinfo)
+
+###############################################################################
+# Worker routine for the local workers
+###############################################################################
+def local_worker(state, taskid, task, lqueue, job, argv, jobinfo):
+    # Execute the task using the job module
+    r, res, ctx = job.spits_worker_run(state, task, taskid)
+
+    if res == None:
+        logging.error('Task %d did not push any result!', taskid)
+        return
+
+    if ctx != taskid:
+        logging.error('Context verification failed for task %d!', taskid)
+        return
+
+    # Hand the result to the committer
+    lqueue.put((taskid, r, res[0]))
+
+###############################################################################
+# Finalizer routine for the local workers
+###############################################################################
+def local_finalizer(state, lqueue, job, argv, jobinfo):
+    job.spits_worker_finalize(state)
+
+###############################################################################
+# Tell the task managers the job finished
+###############################################################################
+def endjob():
+    logging.info('Ending job %d at the task managers...', jm_jobid)
+
+    # Load the list of nodes to connect to
+    tmlist = load_tm_list()
+
+    for name, tm in tmlist.items():
+        try:
+            logging.debug('Connecting to %s:%d...', tm.address, tm.port)
+
+            open_endpoint(tm, messaging.msg_end_job)
+            tm.Close()
+        except:
+            # Problem connecting to the task manager
+            logging.warning('Error connecting to task manager at %s:%d!',
+                tm.address, tm.port)
+
 ###############################################################################
 # Kill all task managers
 ###############################################################################
@@ -558,6 +1308,7 @@ def killtms():
             tm.Open(jm_conn_timeout)
             tm.WriteInt64(messaging.msg_terminate)
             tm.Close()
+            deregister_tm(name)
         except:
             # Problem connecting to the task manager
             logging.warning('Error connecting to task manager at %s:%d!',
@@ -573,14 +1324,90 @@ def run(argv, jobinfo, job):
     # Keep an extra list of completed tasks
     completed = {0: 0}
 
+    # Tasks that expired or were lost in a dead task manager,
+    # to be sent again
+    retries = collections.deque()
+
     # Start the job manager
     logging.info('Starting job manager...')
 
     # Create the job manager from the job module
     jm = job.spits_job_manager_new(argv, jobinfo)
 
+    # Start the local workers, they share the queues of the job
+    # manager and the committer in memory
+    lpool = None
+    lqueue = None
+    if jm_local_workers > 0:
+        logging.info('Starting %d local workers...', jm_local_workers)
+        lqueue = queue.Queue()
+        lpool = TaskPool(jm_local_workers, 0, local_initializer,
+            local_worker, (lqueue, job, argv, jobinfo), local_finalizer,
+            deadline = lambda j: jm_deadline,
+            expired = lambda j, taskid, task: lqueue.put((taskid,
+                messaging.res_module_timeout, None)))
+
+    # The job info is also the read-only data broadcast to the workers
+    jobdata = (DataCache.digest(jobinfo), jobinfo if jobinfo != None else b'')
+
+    # Open the result cache, the results also depend on the job data
+    # if the workers take it, only the modules marking their tasks as
+    # cacheable use it
+    global jm_result_cache
+    hqueue = None
+    if jm_result_cache_dir != None and \
+        not job.has_entry('spits_task_cacheable'):
+        logging.warning('The module does not mark its tasks as ' +
+            'cacheable, the result cache will not be used!')
+    elif jm_result_cache_dir != None:
+        logging.info('Using the result cache at %s.', jm_result_cache_dir)
+        jm_result_cache = ResultCache(jm_result_cache_dir,
+            jm_result_cache_size, ResultCache.scope(job.filename, argv,
+            jobdata[0] if job.has_entry('spits_worker_new_with_data')
+            else None))
+        hqueue = queue.Queue()
+
+    # Hold the results completed out of order
+    global jm_reorder
+    if jm_ordered:
+        logging.info('Committing in task order with a window of %d tasks.',
+            jm_reorder_window)
+        jm_reorder = ReorderBuffer(jm_reorder_window, jm_reorder_budget,
+            jm_spill_dir)
+
+    # Commit the results in batches if the committer accepts them
+    global jm_batch
+    if jm_batch_count > 1 and job.has_entry('spits_committer_commit_pits'):
+        logging.info('Committing in batches of up to %d results.',
+            jm_batch_count)
+        jm_batch = ResultBatch(jm_batch_count, jm_batch_budget,
+            jm_batch_latency)
+
+    # Track the liveness of the task managers, unless the local workers
+    # run the job alone
+    liveness = None
+    remote = lpool == None or jm_register or len(load_tm_list()) > 0
+    if jm_heartbeat > 0 and remote:
+        liveness = Liveness(jm_heartbeat_misses, jm_quarantine,
+            config.quarantine_max_backoff)
+        hbthread = threading.Thread(target=heartbeat,
+            args=(tasklist, completed, liveness, retries))
+        hbthread.daemon = True
+        hbthread.start()
+
+    # Generate the tasks ahead in the background
+    global jm_tasks
+    genthread = None
+    if jm_prefetch > 0:
+        jm_tasks = TaskBuffer(jm_prefetch, jm_prefetch_budget)
+        genthread = threading.Thread(target=generator,
+            args=(job, jm, jm_tasks))
+        genthread.daemon = True
+        genthread.start()
+
     jmthread = threading.Thread(target=jobmanager,
-        args=(argv, job, jm, tasklist, completed))
+        args=(argv, job, jm, tasklist, completed, lpool, hqueue, retries,
+        liveness, jobdata))
     jmthread.start()
 
     # Start the committer
@@ -590,17 +1417,42 @@ def run(argv, jobinfo, job):
     co = job.spits_committer_new(argv, jobinfo)
 
     cothread = threading.Thread(target=committer,
-        args=(argv, job, co, tasklist, completed))
+        args=(argv, job, co, tasklist, completed, lpool, lqueue, hqueue,
+        retries, liveness))
     cothread.start()
 
     # Wait for both threads
     jmthread.join()
     cothread.join()
-
-    # Commit the job
-    logging.info('Committing Job...')
-    r, res, ctx = job.spits_committer_commit_job(co, 0x12345678)
-    logging.debug('Job committed.')
+    if genthread != None:
+        jm_tasks.Close()
+        genthread.join()
+
+    # Release the job in the task managers
+    endjob()
+
+    if jm_reorder != None and jm_reorder.Pending() > 0:
+        logging.error('%d results are still waiting for task %d and ' +
+            'were not committed!', jm_reorder.Pending(), jm_reorder.Next())
+
+    # Stop the local workers
+    if lpool != None:
+        lpool.Join()
+
+    if jm_result_cache != None:
+        logging.info('Result cache: %d hits, %d misses, ' +
+            '%d entries, %d bytes.', *jm_result_cache.Stats())
+
+    # Commit the job, unless some of its tasks were never generated
+    global jm_error
+    if jm_tasks != None and jm_tasks.error != None:
+        jm_error = jm_tasks.error
+        logging.error('The job is incomplete and will not be committed!')
+    else:
+        logging.info('Committing Job...')
+        r, res, ctx = job.spits_committer_commit_job(co, 0x12345678,
+            jm_result_file)
+        logging.debug('Job committed.')
 
     # Finalize the job manager
     logging.debug('Finalizing Job Manager...')
@@ -610,6 +1462,9 @@ def run(argv, jobinfo, job):
     logging.debug('Finalizing Committer...')
     job.spits_committer_finalize(co)
 
+    if jm_error != None:
+        return messaging.res_module_error, None
+
     if res == None:
         logging.error('Job did not push any result!')
         return messaging.res_module_noans, None
@@ -639,7 +1494,23 @@ def main(argv):
 
     # Load the module
     module = args.margs[0]
-    job = JobBinary(module)
+    job = JobModule(module) if JobModule.is_python(module) \
+        else JobBinary(module)
+
+    # Task managers already running the same module reuse it
+    global jm_module_digest
+    with open(job.filename, 'rb') as f:
+        jm_module_digest = DataCache.digest(f.read())
+
+    # Track the progress of the job
+    global jm_status
+    jm_status = JobStatus(jm_jobid)
+
+    # Let the task managers register themselves and the monitors
+    # query the progress
+    registry = None
+    if jm_register or jm_monitor:
+        registry = start_registry()
 
     # Remove JM arguments when passing to the module
     margv = args.margs
@@ -656,8 +1527,18 @@ def main(argv):
     if jm_killtms:
         killtms()
 
+    # Stop accepting registrations and queries
+    if registry != None:
+        registry.Stop()
+        registry.Join()
+
+    # A failed job exits with an error
+    if jm_error != None:
+        abort(jm_error)
+
     # Finalize
     logging.debug('Bye!')
+    finish_log()
     #exit(r)
 
 ###############################################################################
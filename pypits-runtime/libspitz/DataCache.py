@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Caian Benedicto <caian@ggaunicamp.com>
+# Copyright (c) 2016 Edson Borin <edson@ic.unicamp.br>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy 
+# of this software and associated documentation files (the "Software"), to 
+# deal in the Software without restriction, including without limitation the 
+# rights to use, copy, modify, merge, publish, distribute, sublicense, 
+# and/or sell copies of the Software, and to permit persons to whom the 
+# Software is furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in 
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR 
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL 
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER 
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING 
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS 
+# IN THE SOFTWARE.
+
+from libspitz import messaging
+
+import hashlib, logging, mmap, os, tempfile
+
+class DataCache(object):
+    """Local disk cache of read-only job data indexed by content hash"""
+
+    def __init__(self, cachedir = None):
+        if cachedir == None:
+            cachedir = os.path.join(tempfile.gettempdir(), 'spits-data')
+        self.cachedir = cachedir
+        try:
+            os.makedirs(cachedir)
+        except OSError:
+            if not os.path.isdir(cachedir):
+                raise
+
+    @staticmethod
+    def digest(data):
+        return hashlib.sha256(data if data != None else b'').hexdigest()
+
+    def path(self, digest):
+        return os.path.join(self.cachedir, digest)
+
+    def Has(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def Store(self, digest, data):
+        if DataCache.digest(data) != digest:
+            logging.error('Job data does not match hash %s!', digest)
+            raise messaging.MessagingError()
+
+        # Write to a temporary file and rename it, so concurrent
+        # readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=self.cachedir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if data != None:
+                    f.write(data)
+            os.rename(tmp, self.path(digest))
+        except:
+            os.unlink(tmp)
+            raise
+
+    def Map(self, digest):
+        # Copy-on-write mapping, the pages are shared with the page cache
+        # and writable buffers can be handed to C without copying
+        with open(self.path(digest), 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
@@ -42,5 +42,23 @@ class Endpoint(object):
     def WriteInt64(self, value):
         self.Write(struct.pack('!q', value))
 
+    def ReadString(self, timeout):
+        size = self.ReadInt64(timeout)
+        if size == 0:
+            return ''
+        return self.Read(size, timeout).decode('utf8')
+
+    def WriteString(self, value):
+        data = value.encode('utf8')
+        self.WriteInt64(len(data))
+        if len(data) > 0:
+            self.Write(data)
+
+    def ReadPayload(self, size, timeout):
+        return self.Read(size, timeout)
+
+    def WritePayload(self, data):
+        self.Write(data)
+
     def Close(self):
         raise NotImplementedError('Please specialize this class to make a custom endpoint')
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Caian Benedicto <caian@ggaunicamp.com>
+# Copyright (c) 2016 Edson Borin <edson@ic.unicamp.br>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy 
+# of this software and associated documentation files (the "Software"), to 
+# deal in the Software without restriction, including without limitation the 
+# rights to use, copy, modify, merge, publish, distribute, sublicense, 
+# and/or sell copies of the Software, and to permit persons to whom the 
+# Software is furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in 
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR 
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL 
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER 
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING 
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS 
+# IN THE SOFTWARE.
+
+from .OStream import OStream
+
+import array, struct, sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class IStream(object):
+    """Reader of the big-endian layout of spitz::istream, views and numpy
+    arrays point into the data without copying"""
+
+    def __init__(self, data):
+        self.data = data
+        self.view = memoryview(data)
+        self.pos = 0
+
+        # Strings are searched in the object under a view when the
+        # view covers all of it
+        self.searchable = data if hasattr(data, 'find') else None
+        if self.searchable == None:
+            obj = getattr(self.view, 'obj', None)
+            if hasattr(obj, 'find') and len(obj) == self.view.nbytes:
+                self.searchable = obj
+
+    def find_nul(self):
+        if self.searchable != None:
+            return self.searchable.find(b'\0', self.pos)
+        # Scan in growing chunks, so only about the length of the
+        # string is copied
+        pos = self.pos
+        chunk = 64
+        while pos < len(self.view):
+            end = self.view[pos:pos + chunk].tobytes().find(b'\0')
+            if end >= 0:
+                return pos + end
+            pos += chunk
+            chunk = min(chunk * 2, 65536)
+        return -1
+
+    def ensure_size(self, n):
+        if len(self.view) - self.pos < n:
+            raise EOFError('Read past the end of the stream!')
+
+    def read(self, code):
+        s = struct.calcsize('!' + code)
+        self.ensure_size(s)
+        v = struct.unpack_from('!' + code, self.data, self.pos)[0]
+        self.pos += s
+        return v
+
+    def ReadBool(self):
+        return self.read('B') != 0
+
+    def ReadChar(self):
+        return self.read('b')
+
+    def ReadByte(self):
+        return self.read('B')
+
+    def ReadShort(self):
+        return self.read('h')
+
+    def ReadUShort(self):
+        return self.read('H')
+
+    def ReadInt(self):
+        return self.read('i')
+
+    def ReadUInt(self):
+        return self.read('I')
+
+    def ReadLongLong(self):
+        return self.read('q')
+
+    def ReadULongLong(self):
+        return self.read('Q')
+
+    def ReadFloat(self):
+        return self.read('f')
+
+    def ReadDouble(self):
+        return self.read('d')
+
+    def ReadString(self):
+        end = self.find_nul()
+        if end < 0:
+            raise EOFError('Unterminated string in the stream!')
+        v = self.view[self.pos:end].tobytes()
+        self.pos = end + 1
+        return v.decode('utf8')
+
+    def ReadData(self, size):
+        return self.ReadView(size).tobytes()
+
+    def ReadView(self, size):
+        self.ensure_size(size)
+        v = self.view[self.pos:self.pos + size]
+        self.pos += size
+        return v
+
+    def Peek(self, size):
+        self.ensure_size(size)
+        return self.view[self.pos:self.pos + size]
+
+    def Skip(self, size):
+        self.ensure_size(size)
+        self.pos += size
+
+    def ReadArray(self, kind, n):
+        # Same as spitz::istream::read_array, numpy arrays are big-endian
+        # views of the stream
+        code = OStream.types[kind]
+        if code == '?':
+            return [x != 0 for x in bytearray(self.ReadView(n))]
+        size = struct.calcsize(code)
+        self.ensure_size(n * size)
+        if numpy != None:
+            v = numpy.frombuffer(self.data, dtype='>' + code, count=n,
+                offset=self.pos)
+            self.pos += n * size
+            return v
+        view = self.ReadView(n * size)
+        try:
+            a = array.array(code)
+        except ValueError:
+            a = None
+        if a == None or a.itemsize != size:
+            return list(struct.unpack('!%d%s' % (n, code), view))
+        if sys.version_info[0] < 3:
+            a.fromstring(view.tobytes())
+        else:
+            a.frombytes(view)
+        if sys.byteorder == 'little':
+            a.byteswap()
+        return a
+
+    def Size(self):
+        return len(self.view)
+
+    def HasData(self):
+        return self.pos < len(self.view)
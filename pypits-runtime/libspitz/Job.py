@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Caian Benedicto <caian@ggaunicamp.com>
+# Copyright (c) 2016 Edson Borin <edson@ic.unicamp.br>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy 
+# of this software and associated documentation files (the "Software"), to 
+# deal in the Software without restriction, including without limitation the 
+# rights to use, copy, modify, merge, publish, distribute, sublicense, 
+# and/or sell copies of the Software, and to permit persons to whom the 
+# Software is furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in 
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR 
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL 
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER 
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING 
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS 
+# IN THE SOFTWARE.
+
+import threading
+
+class Job(object):
+    """A job running in a task manager, with its module, arguments and
+    the read-only data shared by its workers"""
+
+    def __init__(self, jobid, binary, argv, deadline = None):
+        self.jobid = jobid
+        self.binary = binary
+        self.argv = argv
+        self.deadline = deadline
+        self.lock = threading.Lock()
+        self.data = None
+        self.digest = None
+        self.ready = threading.Event()
+        self.cache = None
+        self.ended = False
+
+        # Workers of modules not taking the data can start right away
+        if not binary.has_entry('spits_worker_new_with_data'):
+            self.ready.set()
+
+    def Matches(self, binary, argv):
+        return self.binary is binary and self.argv == argv
+
+    def NeedsData(self):
+        return not self.ready.is_set()
+
+    def SetData(self, digest, data):
+        with self.lock:
+            if self.ready.is_set():
+                return
+            self.digest = digest
+            self.data = data
+            self.ready.set()
+
+    def WaitData(self):
+        self.ready.wait()
+
+    def End(self):
+        self.ended = True
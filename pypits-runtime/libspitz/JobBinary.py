@@ -22,7 +22,10 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS 
 # IN THE SOFTWARE.
 
-import ctypes, os, struct, sys, logging
+from .LargeObject import LargeObject
+from libspitz import config
+
+import ctypes, os, struct, sys, logging, mmap
 
 # TODO try-except around C calls
 
@@ -35,6 +38,9 @@ class JobBinary(object):
         self.filename = filename
         self.module = ctypes.CDLL(filename)
 
+        # Final result handed to spits_main, it must outlive the runner
+        self.final_result = None
+
         # Create the return type for the *new functions, otherwise
         # it will assume int as return instead of void*
         rettype_new = ctypes.c_void_p
@@ -45,6 +51,11 @@ class JobBinary(object):
         self.module.spits_job_manager_new.restype = rettype_new;
         self.module.spits_worker_new.restype = rettype_new;
         self.module.spits_committer_new.restype = rettype_new;
+        if hasattr(self.module, 'spits_worker_new_with_data'):
+            self.module.spits_worker_new_with_data.restype = rettype_new;
+        if hasattr(self.module, 'spits_job_manager_task_priority'):
+            self.module.spits_job_manager_task_priority.restype = \
+                ctypes.c_longlong
 
         # Create the c function for the runner callback
         self.crunner = ctypes.CFUNCTYPE(
@@ -63,6 +74,9 @@ class JobBinary(object):
             ctypes.c_longlong,
             ctypes.c_void_p)
 
+    def has_entry(self, name):
+        return hasattr(self.module, name)
+
     def c_argv(self, argv):
         # Encode the string to byte array
         argv = [x.encode('utf8') for x in argv]
@@ -93,16 +107,42 @@ class JobBinary(object):
         # Cover the case where an empty array or list is passed
         if it == None or len(it) == 0:
             return ctypes.c_void_p(None), 0
+        # Writable buffers such as mapped files are passed without copying
+        if isinstance(it, (mmap.mmap, bytearray)):
+            cit = (ctypes.c_byte * len(it)).from_buffer(it)
+            return cit, ctypes.c_longlong(len(it))
+        # Bytes are passed as a pointer to their own buffer, the entry
+        # points never write to their inputs
+        if isinstance(it, bytes):
+            return ctypes.c_char_p(it), ctypes.c_longlong(len(it))
         # Normal C allocation
         cit = (ctypes.c_byte * len(it))()
-        cit[:] = self.unbyte(it)
+        ctypes.memmove(cit, it, len(it))
         citsz = ctypes.c_longlong(len(it))
         return cit, citsz
 
     def to_py_array(self, v, sz):
-        v = ctypes.cast(v, ctypes.POINTER(ctypes.c_byte))
-        return self.bytes(v[0:sz])
-        
+        return ctypes.string_at(v, sz)
+
+    def to_payload(self, v, sz):
+        # Large tasks and results are spilled to a mapped file
+        if not LargeObject.Large(sz):
+            return self.to_py_array(v, sz)
+        m = LargeObject(sz, config.spill_dir)
+        ctypes.memmove((ctypes.c_byte * sz).from_buffer(m), v, sz)
+        return m
+
+    def to_file(self, v, sz, filename):
+        # Copy the C buffer straight into the mapped file,
+        # avoiding the intermediate python string
+        with open(filename, 'w+b') as f:
+            if sz == 0:
+                return b''
+            f.truncate(sz)
+            m = mmap.mmap(f.fileno(), sz)
+        ctypes.memmove((ctypes.c_byte * sz).from_buffer(m), v, sz)
+        return m
+
     def spits_main(self, argv, runner):
         # Call the runner if the job does not have an initializer
         if not hasattr(self.module, 'spits_main'):
@@ -117,13 +157,14 @@ class JobBinary(object):
             # Run the runner code
             r, pdata = runner(pargv, pjobinfo)
 
-            # Convert the data result to a C pointer/size
+            # Convert the data result to a C pointer/size, a mapped
+            # file is passed without copying
             if pdata == None:
                 data[0] = None
                 size[0] = 0
             else:
-                cdata = (ctypes.c_byte * len(pdata))()
-                cdata[:] = self.unbyte(pdata)
+                cdata, csize = self.to_c_array(pdata)
+                self.final_result = cdata
                 data[0] = ctypes.cast(cdata, ctypes.c_void_p)
                 size[0] = len(pdata)
 
@@ -151,7 +192,7 @@ class JobBinary(object):
         def push(ctask, ctasksz, ctx):
             # Thanks to python closures, the context is not 
             # necessary, in any case, check for correctness
-            res[1] = (self.to_py_array(ctask, ctasksz),)
+            res[1] = (self.to_payload(ctask, ctasksz),)
             res[2] = ctx
 
         # Get the next task
@@ -160,6 +201,15 @@ class JobBinary(object):
 
         return res
 
+    def spits_job_manager_task_priority(self, user_data, task, taskid):
+        # Optional function, the oldest tasks first by default
+        if not hasattr(self.module, 'spits_job_manager_task_priority'):
+            return taskid
+
+        ctask, ctasksz = self.to_c_array(task)
+        return self.module.spits_job_manager_task_priority(user_data,
+            ctask, ctasksz, ctypes.c_longlong(taskid))
+
     def spits_job_manager_finalize(self, user_data):
         # Optional function
         if not hasattr(self.module, 'spits_job_manager_finalize'):
@@ -175,6 +225,18 @@ class JobBinary(object):
 
         return ctypes.c_void_p(self.module.spits_worker_new(cargc, cargv))
 
+    def spits_worker_new_with_data(self, argv, data):
+        # Optional function, the worker is created without the job data
+        if not hasattr(self.module, 'spits_worker_new_with_data'):
+            return self.spits_worker_new(argv)
+
+        # Cast the C arguments
+        cargc, cargv = self.c_argv(argv)
+        cdata, cdatasz = self.to_c_array(data)
+
+        return ctypes.c_void_p(self.module.spits_worker_new_with_data(
+            cargc, cargv, cdata, cdatasz))
+
     def spits_worker_run(self, user_data, task, taskctx):
         res = [None, None, None]
 
@@ -185,7 +247,7 @@ class JobBinary(object):
         def push(cres, cressz, ctx):
             # Thanks to python closures, the context is not 
             # necessary, in any case, check for correctness
-            res[1] = (self.to_py_array(cres, cressz),)
+            res[1] = (self.to_payload(cres, cressz),)
             res[2] = ctx
 
         # Run the task
@@ -194,6 +256,47 @@ class JobBinary(object):
 
         return res
 
+    def spits_worker_run_batch(self, user_data, tasks, taskctxs):
+        # Optional function, the tasks are run one at a time
+        if not hasattr(self.module, 'spits_worker_run_batch'):
+            return [self.spits_worker_run(user_data, task, taskctx)
+                for task, taskctx in zip(tasks, taskctxs)]
+
+        # Create the arrays of pointers, sizes and contexts, the
+        # converted tasks must be alive during the call
+        n = len(tasks)
+        ctasks = [self.to_c_array(task) for task in tasks]
+        cptrs = (ctypes.c_void_p * n)()
+        csizes = (ctypes.c_longlong * n)()
+        cctxs = (ctypes.c_void_p * n)()
+        crets = (ctypes.c_int * n)()
+        slots = {}
+        for i, (ctask, ctasksz) in enumerate(ctasks):
+            cptrs[i] = ctypes.cast(ctask, ctypes.c_void_p)
+            csizes[i] = len(tasks[i]) if tasks[i] != None else 0
+            cctxs[i] = taskctxs[i]
+            slots[taskctxs[i]] = i
+
+        res = [[None, None, None] for i in range(n)]
+
+        # Route each result to its task using the context, a null
+        # pointer is received as None
+        def push(cres, cressz, ctx):
+            i = slots.get(ctx if ctx != None else 0, None)
+            if i == None:
+                return
+            res[i][1] = (self.to_payload(cres, cressz),)
+            res[i][2] = taskctxs[i]
+
+        # Run the tasks
+        r = self.module.spits_worker_run_batch(user_data,
+            ctypes.c_longlong(n), cptrs, csizes, self.cpusher(push),
+            cctxs, crets)
+
+        for i in range(n):
+            res[i][0] = crets[i] if r == 0 else r
+        return res
+
     def spits_worker_finalize(self, user_data):
         # Optional function
         if not hasattr(self.module, 'spits_worker_finalize'):
@@ -217,14 +320,40 @@ class JobBinary(object):
 
         return self.module.spits_committer_commit_pit(user_data, cres, cressz)
 
-    def spits_committer_commit_job(self, user_data, jobctx):
+    def spits_committer_commit_pits(self, user_data, results):
+        # Optional function, the results are committed one at a time
+        if not hasattr(self.module, 'spits_committer_commit_pits'):
+            r = 0
+            for result in results:
+                ri = self.spits_committer_commit_pit(user_data, result)
+                if ri != 0:
+                    r = ri
+            return r
+
+        # Create the arrays of pointers and sizes, the converted
+        # results must be alive during the call
+        n = len(results)
+        cresults = [self.to_c_array(result) for result in results]
+        cptrs = (ctypes.c_void_p * n)()
+        csizes = (ctypes.c_longlong * n)()
+        for i, (cres, cressz) in enumerate(cresults):
+            cptrs[i] = ctypes.cast(cres, ctypes.c_void_p)
+            csizes[i] = len(results[i]) if results[i] != None else 0
+        return self.module.spits_committer_commit_pits(user_data,
+            ctypes.c_longlong(n), cptrs, csizes)
+
+    def spits_committer_commit_job(self, user_data, jobctx, filename = None):
         fres = [None, None, None]
 
-        # Create an inner converter for the callback
+        # Create an inner converter for the callback, large results
+        # go to a mapped file instead of memory
         def push(cfres, cfressz, ctx):
             # Thanks to python closures, the context is not 
             # necessary, in any case, check for correctness
-            fres[1] = (self.to_py_array(cfres, cfressz),)
+            if filename == None:
+                fres[1] = (self.to_py_array(cfres, cfressz),)
+            else:
+                fres[1] = (self.to_file(cfres, cfressz, filename),)
             fres[2] = ctx
 
         # Commit job and get the final result
@@ -241,3 +370,11 @@ class JobBinary(object):
         # Is expected that the framework will not mess with the
         # value inside user_data do its ctype will remain unchanged
         return self.module.spits_committer_finalize(user_data)
+
+    def spits_task_cacheable(self, task):
+        # Optional function, no result is cached by default
+        if not hasattr(self.module, 'spits_task_cacheable'):
+            return False
+
+        ctask, ctasksz = self.to_c_array(task)
+        return self.module.spits_task_cacheable(ctask, ctasksz) != 0
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Caian Benedicto <caian@ggaunicamp.com>
+# Copyright (c) 2016 Edson Borin <edson@ic.unicamp.br>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy 
+# of this software and associated documentation files (the "Software"), to 
+# deal in the Software without restriction, including without limitation the 
+# rights to use, copy, modify, merge, publish, distribute, sublicense, 
+# and/or sell copies of the Software, and to permit persons to whom the 
+# Software is furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in 
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR 
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL 
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER 
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING 
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS 
+# IN THE SOFTWARE.
+
+import hashlib, mmap, os
+
+class JobModule(object):
+    """Job written in python, with the same interface as JobBinary
+
+    The module defines the spits entry points as functions, or as methods
+    of an object named spits_job (a class is instantiated first). Tasks
+    and results are pushed as bytes and passed along without conversion:
+
+        def spits_job_manager_new(argv, jobinfo): ...
+        def spits_job_manager_next_task(user_data, push, ctx): ...
+        def spits_worker_new(argv): ...
+        def spits_worker_run(user_data, task, push, ctx): ...
+        def spits_committer_new(argv, jobinfo): ...
+        def spits_committer_commit_pit(user_data, result): ...
+        def spits_committer_commit_job(user_data, push, ctx): ...
+
+    spits_main(argv, runner), spits_worker_new_with_data(argv, data),
+    spits_job_manager_task_priority(user_data, task, taskid),
+    spits_worker_run_batch(user_data, tasks, push, ctxs), returning the
+    list of return codes, spits_committer_commit_pits(user_data, results),
+    spits_task_cacheable(task) and the *_finalize(user_data) functions
+    are optional."""
+
+    # Constructor
+    def __init__(self, filename):
+        filename = os.path.realpath(filename)
+        self.filename = filename
+        self.module = self.load(filename)
+
+        # Object implementing the entry points
+        target = getattr(self.module, 'spits_job', self.module)
+        if isinstance(target, type):
+            target = target()
+        self.target = target
+
+    @staticmethod
+    def is_python(filename):
+        return filename.endswith('.py')
+
+    def load(self, filename):
+        # Load the source from its path, the task manager loads
+        # copies that are named by their hash and have no extension
+        name = 'spits_job_' + hashlib.sha1(
+            filename.encode('utf8')).hexdigest()[:16]
+        try:
+            import importlib.machinery, importlib.util
+        except ImportError:
+            import imp # Python 2
+            return imp.load_source(name, filename)
+        loader = importlib.machinery.SourceFileLoader(name, filename)
+        spec = importlib.util.spec_from_file_location(name, filename,
+            loader=loader)
+        module = importlib.util.module_from_spec(spec)
+        loader.exec_module(module)
+        return module
+
+    def has_entry(self, name):
+        return hasattr(self.target, name)
+
+    def entry(self, name):
+        return getattr(self.target, name)
+
+    def to_file(self, res, filename):
+        # Keep the final result in a mapped file
+        with open(filename, 'w+b') as f:
+            if res == None or len(res) == 0:
+                return b''
+            f.write(res)
+            f.flush()
+            return mmap.mmap(f.fileno(), len(res))
+
+    def spits_main(self, argv, runner):
+        # Call the runner if the job does not have an initializer
+        if not self.has_entry('spits_main'):
+            return runner(argv, None)
+        return self.entry('spits_main')(argv, runner)
+
+    def spits_job_manager_new(self, argv, jobinfo):
+        return self.entry('spits_job_manager_new')(argv,
+            jobinfo if jobinfo != None else b'')
+
+    def spits_job_manager_next_task(self, user_data, jmctx):
+        res = [None, None, None]
+
+        def push(task, ctx):
+            res[1] = (task,)
+            res[2] = ctx
+
+        res[0] = self.entry('spits_job_manager_next_task')(user_data,
+            push, jmctx)
+        return res
+
+    def spits_job_manager_task_priority(self, user_data, task, taskid):
+        # Optional function, the oldest tasks first by default
+        if not self.has_entry('spits_job_manager_task_priority'):
+            return taskid
+        return self.entry('spits_job_manager_task_priority')(user_data,
+            task, taskid)
+
+    def spits_job_manager_finalize(self, user_data):
+        # Optional function
+        if not self.has_entry('spits_job_manager_finalize'):
+            return
+        return self.entry('spits_job_manager_finalize')(user_data)
+
+    def spits_worker_new(self, argv):
+        return self.entry('spits_worker_new')(argv)
+
+    def spits_worker_new_with_data(self, argv, data):
+        # Optional function, the worker is created without the job data
+        if not self.has_entry('spits_worker_new_with_data'):
+            return self.spits_worker_new(argv)
+        return self.entry('spits_worker_new_with_data')(argv,
+            data if data != None else b'')
+
+    def spits_worker_run(self, user_data, task, taskctx):
+        res = [None, None, None]
+
+        def push(result, ctx):
+            res[1] = (result,)
+            res[2] = ctx
+
+        res[0] = self.entry('spits_worker_run')(user_data,
+            task if task != None else b'', push, taskctx)
+        return res
+
+    def spits_worker_run_batch(self, user_data, tasks, taskctxs):
+        # Optional function, the tasks are run one at a time
+        if not self.has_entry('spits_worker_run_batch'):
+            return [self.spits_worker_run(user_data, task, taskctx)
+                for task, taskctx in zip(tasks, taskctxs)]
+
+        res = [[None, None, None] for task in tasks]
+        slots = dict((taskctx, i) for i, taskctx in enumerate(taskctxs))
+
+        def push(result, ctx):
+            i = slots.get(ctx, None)
+            if i == None:
+                return
+            res[i][1] = (result,)
+            res[i][2] = ctx
+
+        rets = self.entry('spits_worker_run_batch')(user_data,
+            [task if task != None else b'' for task in tasks], push,
+            list(taskctxs))
+        for i, r in enumerate(rets):
+            res[i][0] = r
+        return res
+
+    def spits_worker_finalize(self, user_data):
+        # Optional function
+        if not self.has_entry('spits_worker_finalize'):
+            return
+        return self.entry('spits_worker_finalize')(user_data)
+
+    def spits_committer_new(self, argv, jobinfo):
+        return self.entry('spits_committer_new')(argv,
+            jobinfo if jobinfo != None else b'')
+
+    def spits_committer_commit_pit(self, user_data, result):
+        return self.entry('spits_committer_commit_pit')(user_data,
+            result if result != None else b'')
+
+    def spits_committer_commit_pits(self, user_data, results):
+        # Optional function, the results are committed one at a time
+        results = [r if r != None else b'' for r in results]
+        if self.has_entry('spits_committer_commit_pits'):
+            return self.entry('spits_committer_commit_pits')(user_data,
+                results)
+        r = 0
+        for result in results:
+            ri = self.entry('spits_committer_commit_pit')(user_data, result)
+            if ri != 0:
+                r = ri
+        return r
+
+    def spits_committer_commit_job(self, user_data, jobctx, filename = None):
+        fres = [None, None, None]
+
+        # Large results go to a mapped file instead of memory
+        def push(result, ctx):
+            if filename == None:
+                fres[1] = (result,)
+            else:
+                fres[1] = (self.to_file(result, filename),)
+            fres[2] = ctx
+
+        fres[0] = self.entry('spits_committer_commit_job')(user_data,
+            push, jobctx)
+        return fres
+
+    def spits_committer_finalize(self, user_data):
+        # Optional function
+        if not self.has_entry('spits_committer_finalize'):
+            return
+        return self.entry('spits_committer_finalize')(user_data)
+
+    def spits_task_cacheable(self, task):
+        # Optional function, no result is cached by default
+        if not self.has_entry('spits_task_cacheable'):
+            return False
+        return bool(self.entry('spits_task_cacheable')(task))
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Caian Benedicto <caian@ggaunicamp.com>
+# Copyright (c) 2016 Edson Borin <edson@ic.unicamp.br>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy 
+# of this software and associated documentation files (the "Software"), to 
+# deal in the Software without restriction, including without limitation the 
+# rights to use, copy, modify, merge, publish, distribute, sublicense, 
+# and/or sell copies of the Software, and to permit persons to whom the 
+# Software is furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in 
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR 
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL 
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER 
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING 
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS 
+# IN THE SOFTWARE.
+
+
+import struct, threading, time
+
+class JobStatus(object):
+    """Progress counters of a running job, updated by the job manager
+    threads and sent to the monitors as a single packed reply"""
+
+    header = struct.Struct('!qqqqqqqqq')
+    entry = struct.Struct('!qqqq')
+    size = struct.Struct('!q')
+
+    def __init__(self, jobid = 0):
+        self.lock = threading.Lock()
+        self.jobid = jobid
+        self.start = time.time()
+        self.generated = 0
+        self.completed = 0
+        self.committed = 0
+        self.retransmitted = 0
+        self.finished = False
+        self.tms = {} # [completed, free, backlog, alive] by task manager
+
+    def tm(self, name):
+        # Unknown values are reported as -1
+        tm = self.tms.get(name, None)
+        if tm == None:
+            tm = [0, -1, -1, 1]
+            self.tms[name] = tm
+        return tm
+
+    def Generated(self):
+        with self.lock:
+            self.generated += 1
+
+    def Retransmitted(self):
+        # Tasks sent again are expired, lost or replicated ones
+        with self.lock:
+            self.retransmitted += 1
+
+    def Completed(self, name):
+        with self.lock:
+            self.completed += 1
+            self.tm(name)[0] += 1
+
+    def Committed(self, n = 1):
+        with self.lock:
+            self.committed += n
+
+    def Finished(self):
+        with self.lock:
+            self.finished = True
+
+    def Free(self, name, n):
+        with self.lock:
+            self.tm(name)[1] = n
+
+    def Backlog(self, name, n):
+        with self.lock:
+            self.tm(name)[2] = n
+
+    def Alive(self, name, alive):
+        with self.lock:
+            self.tm(name)[3] = 1 if alive else 0
+
+    def Pack(self, detail):
+        # Copy the counters and pack them outside the lock
+        with self.lock:
+            counters = (self.jobid, int((time.time() - self.start) * 1000),
+                self.generated, self.generated - self.completed,
+                self.completed, self.committed, self.retransmitted,
+                1 if self.finished else 0)
+            tms = [(name, tuple(tm)) for name, tm in self.tms.items()] \
+                if detail else []
+        data = [JobStatus.header.pack(*(counters + (len(tms),)))]
+        for name, tm in tms:
+            name = name.encode('utf8')
+            data.append(JobStatus.size.pack(len(name)))
+            data.append(name)
+            data.append(JobStatus.entry.pack(*tm))
+        return b''.join(data)
+
+    @staticmethod
+    def Unpack(data):
+        (jobid, elapsed, generated, inflight, completed, committed,
+            retransmitted, finished, ntms) = \
+            JobStatus.header.unpack_from(data, 0)
+        pos = JobStatus.header.size
+        tms = {}
+        for i in range(ntms):
+            n = JobStatus.size.unpack_from(data, pos)[0]
+            pos += JobStatus.size.size
+            name = data[pos:pos + n].decode('utf8')
+            pos += n
+            tms[name] = JobStatus.entry.unpack_from(data, pos)
+            pos += JobStatus.entry.size
+        return {'jobid': jobid, 'elapsed': elapsed / 1000.0,
+            'generated': generated, 'inflight': inflight,
+            'completed': completed, 'committed': committed,
+            'retransmitted': retransmitted, 'finished': finished != 0,
+            'tms': tms}
@@ -58,8 +58,12 @@ class Listener(object):
             logging.info('Listening to file at %s...',
                 self.addr)
         while True:
+            sock = self.socket
+            if sock == None:
+                # Stopped
+                break
             try:
-                conn, addr = self.socket.accept()
+                conn, addr = sock.accept()
 
                 # Assign the address from the connection
                 if self.mode == config.mode_tcp:
@@ -76,6 +80,8 @@ class Listener(object):
                 threading.Thread(target = self.callback,
                     args=((endpoint, addr, port) + self.user_args)).start()
             except:
+                if self.socket == None:
+                    break
                 print(sys.exc_info())
                 traceback.print_exc()
                 logging.debug('O oh!')
@@ -132,8 +138,14 @@ class Listener(object):
 
     def Stop(self):
         if self.socket:
-            self.socket.close()
+            sock = self.socket
             self.socket = None
+            # Wake up the thread blocked in accept
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            sock.close()
             if self.mode == config.mode_uds:
                 # Remove the socket file if it is an UDS
                 try:
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Caian Benedicto <caian@ggaunicamp.com>
+# Copyright (c) 2016 Edson Borin <edson@ic.unicamp.br>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy 
+# of this software and associated documentation files (the "Software"), to 
+# deal in the Software without restriction, including without limitation the 
+# rights to use, copy, modify, merge, publish, distribute, sublicense, 
+# and/or sell copies of the Software, and to permit persons to whom the 
+# Software is furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in 
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR 
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL 
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER 
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING 
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS 
+# IN THE SOFTWARE.
+
+import threading, time
+
+class Liveness(object):
+    """Liveness of the task managers seen by a job manager, the ones
+    missing too many heartbeats are quarantined with exponential backoff"""
+
+    def __init__(self, misses, backoff, max_backoff):
+        self.misses = misses
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lock = threading.Lock()
+        self.nodes = {} # [misses, deaths, quarantine end, instance]
+
+    def node(self, machineid):
+        return self.nodes.setdefault(machineid, [0, 0, None, None])
+
+    def Alive(self, machineid, instance):
+        # Returns True if the task manager was restarted, so the
+        # tasks sent to it were lost
+        with self.lock:
+            n = self.node(machineid)
+            restarted = n[3] != None and n[3] != instance
+            n[0] = 0
+            n[1] = 0
+            n[2] = None
+            n[3] = instance
+            return restarted
+
+    def Missed(self, machineid):
+        # Returns True if the task manager has just been declared dead
+        with self.lock:
+            n = self.node(machineid)
+            n[0] += 1
+            if n[0] < self.misses:
+                return False
+            died = n[2] == None
+            n[1] += 1
+            n[2] = time.time() + min(self.backoff * 2 ** (n[1] - 1),
+                self.max_backoff)
+            return died
+
+    def Available(self, machineid):
+        with self.lock:
+            return self.nodes.get(machineid, (0, 0, None))[2] == None
+
+    def Due(self, machineid):
+        # Quarantined task managers are only probed after the backoff
+        with self.lock:
+            until = self.nodes.get(machineid, (0, 0, None))[2]
+            return until == None or time.time() >= until
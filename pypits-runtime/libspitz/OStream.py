@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Caian Benedicto <caian@ggaunicamp.com>
+# Copyright (c) 2016 Edson Borin <edson@ic.unicamp.br>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy 
+# of this software and associated documentation files (the "Software"), to 
+# deal in the Software without restriction, including without limitation the 
+# rights to use, copy, modify, merge, publish, distribute, sublicense, 
+# and/or sell copies of the Software, and to permit persons to whom the 
+# Software is furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in 
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR 
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL 
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER 
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING 
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS 
+# IN THE SOFTWARE.
+
+import array, struct, sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class OStream(object):
+    """Writer of the big-endian layout of spitz::ostream, arrays are
+    converted as a whole with numpy or array"""
+
+    # Stream type names and their struct codes
+    types = {
+        'bool' : '?', 'char' : 'b', 'byte' : 'B', 'short' : 'h',
+        'ushort' : 'H', 'int' : 'i', 'uint' : 'I', 'longlong' : 'q',
+        'ulonglong' : 'Q', 'float' : 'f', 'double' : 'd'
+    }
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, code, v):
+        self.data += struct.pack('!' + code, v)
+
+    def WriteBool(self, v):
+        self.write('B', 1 if v else 0)
+
+    def WriteChar(self, v):
+        self.write('b', v)
+
+    def WriteByte(self, v):
+        self.write('B', v)
+
+    def WriteShort(self, v):
+        self.write('h', v)
+
+    def WriteUShort(self, v):
+        self.write('H', v)
+
+    def WriteInt(self, v):
+        self.write('i', v)
+
+    def WriteUInt(self, v):
+        self.write('I', v)
+
+    def WriteLongLong(self, v):
+        self.write('q', v)
+
+    def WriteULongLong(self, v):
+        self.write('Q', v)
+
+    def WriteFloat(self, v):
+        self.write('f', v)
+
+    def WriteDouble(self, v):
+        self.write('d', v)
+
+    def WriteString(self, v):
+        if not isinstance(v, bytes):
+            v = v.encode('utf8')
+        self.data += v
+        self.data += b'\0'
+
+    def WriteData(self, v):
+        self.data += v
+
+    def WriteArray(self, kind, v):
+        # Same as spitz::ostream::write_array, the count is not written
+        code = self.types[kind]
+        if code == '?':
+            self.data += bytearray(1 if x else 0 for x in v)
+            return
+        if numpy != None and isinstance(v, numpy.ndarray):
+            self.data += numpy.asarray(v, dtype='>' + code).tobytes()
+            return
+        try:
+            a = array.array(code, v)
+        except (ValueError, TypeError):
+            a = None
+        if a == None or a.itemsize != struct.calcsize(code):
+            self.data += struct.pack('!%d%s' % (len(v), code), *v)
+            return
+        if sys.byteorder == 'little':
+            a.byteswap()
+        self.data += a.tostring() if sys.version_info[0] < 3 \
+            else a.tobytes()
+
+    def Pos(self):
+        return len(self.data)
+
+    def Data(self):
+        return bytes(self.data)
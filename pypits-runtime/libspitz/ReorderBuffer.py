@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Caian Benedicto <caian@ggaunicamp.com>
+# Copyright (c) 2016 Edson Borin <edson@ic.unicamp.br>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy 
+# of this software and associated documentation files (the "Software"), to 
+# deal in the Software without restriction, including without limitation the 
+# rights to use, copy, modify, merge, publish, distribute, sublicense, 
+# and/or sell copies of the Software, and to permit persons to whom the 
+# Software is furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in 
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR 
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL 
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER 
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING 
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS 
+# IN THE SOFTWARE.
+
+from .LargeObject import LargeObject
+
+import logging, struct, tempfile, threading, time
+
+class ReorderBuffer(object):
+    """Results completed ahead of the commit point, released in task
+    order, results beyond the memory budget are kept in a spill file"""
+
+    # result code, payload size (-1 for no payload)
+    header = struct.Struct('!qq')
+
+    def __init__(self, window, budget = None, spilldir = None, first = 1):
+        self.window = window
+        self.budget = budget
+        self.spilldir = spilldir
+        self.lock = threading.Lock()
+        self.next = first
+        self.memory = {} # taskid -> (result code, payload)
+        self.used = 0
+        self.spill = None
+        self.spilled = {} # taskid -> offset in the spill file
+        self.wpos = 0
+        self.moved = time.time() # Last time the commit point moved
+
+    def Put(self, taskid, r, res):
+        size = self.weight(res)
+        with self.lock:
+            # The next result to commit never waits on the disk, and
+            # the large objects are already there
+            if taskid == self.next or self.budget == None or \
+                size == 0 or self.used + size <= self.budget:
+                self.memory[taskid] = (r, res)
+                self.used += size
+                return
+            self.write_spill(taskid, r, res)
+
+    def Pop(self):
+        with self.lock:
+            taskid = self.next
+            if taskid in self.memory:
+                r, res = self.memory.pop(taskid)
+                self.used -= self.weight(res)
+            elif taskid in self.spilled:
+                r, res = self.read_spill(taskid)
+            else:
+                return None
+            self.next += 1
+            self.moved = time.time()
+            return (taskid, r, res)
+
+    def Next(self):
+        return self.next
+
+    def Full(self, taskid):
+        return taskid - self.next >= self.window
+
+    def Stalled(self, timeout):
+        # True at most once per timeout while the commit point is stuck
+        with self.lock:
+            now = time.time()
+            if now - self.moved < timeout:
+                return False
+            self.moved = now
+            return True
+
+    def Pending(self):
+        return len(self.memory) + len(self.spilled)
+
+    def weight(self, res):
+        # Large objects are already kept on disk
+        if res == None or isinstance(res, LargeObject):
+            return 0
+        return len(res)
+
+    def write_spill(self, taskid, r, res):
+        if self.spill == None:
+            self.spill = tempfile.TemporaryFile(prefix='spits-reorder-',
+                dir=self.spilldir)
+        if len(self.spilled) == 0:
+            logging.warning('Reorder memory budget of %d bytes exceeded, ' +
+                'spilling results to disk...', self.budget)
+        self.spill.seek(self.wpos)
+        if res == None:
+            self.spill.write(self.header.pack(r, -1))
+        else:
+            self.spill.write(self.header.pack(r, len(res)))
+            self.spill.write(res)
+        self.spilled[taskid] = self.wpos
+        self.wpos = self.spill.tell()
+
+    def read_spill(self, taskid):
+        self.spill.flush()
+        self.spill.seek(self.spilled.pop(taskid))
+        r, size = self.header.unpack(self.spill.read(self.header.size))
+        res = None if size < 0 else self.spill.read(size)
+        if len(self.spilled) == 0:
+            # Everything was read back, reuse the file from the start
+            logging.info('Spilled reorder results drained.')
+            self.spill.seek(0)
+            self.spill.truncate()
+            self.wpos = 0
+        return (r, res)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Caian Benedicto <caian@ggaunicamp.com>
+# Copyright (c) 2016 Edson Borin <edson@ic.unicamp.br>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy 
+# of this software and associated documentation files (the "Software"), to 
+# deal in the Software without restriction, including without limitation the 
+# rights to use, copy, modify, merge, publish, distribute, sublicense, 
+# and/or sell copies of the Software, and to permit persons to whom the 
+# Software is furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in 
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR 
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL 
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER 
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING 
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS 
+# IN THE SOFTWARE.
+
+
+import time
+from .LargeObject import LargeObject
+
+class ResultBatch(object):
+    """Results waiting to be committed together, limited by the number
+    of results, their total size and the time the oldest one waits"""
+
+    def __init__(self, count, budget = None, latency = None):
+        self.count = count
+        self.budget = budget
+        self.latency = latency
+        self.items = []
+        self.used = 0
+        self.since = None
+
+    def weight(self, res):
+        # Large objects are already kept on disk
+        if res == None or isinstance(res, LargeObject):
+            return 0
+        return len(res)
+
+    def __len__(self):
+        return len(self.items)
+
+    def Add(self, taskid, r, res):
+        # Returns True when the batch should be committed
+        if len(self.items) == 0:
+            self.since = time.time()
+        self.items.append((taskid, r, res))
+        self.used += self.weight(res)
+        return self.Full()
+
+    def Full(self):
+        return len(self.items) >= self.count or (self.budget != None and
+            self.used >= self.budget)
+
+    def Due(self):
+        if len(self.items) == 0:
+            return False
+        return self.Full() or (self.latency != None and
+            time.time() - self.since >= self.latency)
+
+    def Take(self):
+        items = self.items
+        self.items = []
+        self.used = 0
+        self.since = None
+        return items
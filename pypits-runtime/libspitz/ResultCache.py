@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Caian Benedicto <caian@ggaunicamp.com>
+# Copyright (c) 2016 Edson Borin <edson@ic.unicamp.br>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy 
+# of this software and associated documentation files (the "Software"), to 
+# deal in the Software without restriction, including without limitation the 
+# rights to use, copy, modify, merge, publish, distribute, sublicense, 
+# and/or sell copies of the Software, and to permit persons to whom the 
+# Software is furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in 
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR 
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL 
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER 
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING 
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS 
+# IN THE SOFTWARE.
+
+import collections, hashlib, os, tempfile, threading
+
+class ResultCache(object):
+    """Local disk cache of task results indexed by the hash of the module,
+    its arguments and the task payload, the least recently used results
+    are evicted when the cache grows beyond its limit"""
+
+    def __init__(self, cachedir = None, limit = None, salt = ''):
+        if cachedir == None:
+            cachedir = os.path.join(tempfile.gettempdir(), 'spits-results')
+        self.cachedir = cachedir
+        self.limit = limit
+        self.salt = salt.encode('utf8')
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        try:
+            os.makedirs(cachedir)
+        except OSError:
+            if not os.path.isdir(cachedir):
+                raise
+
+        # Rebuild the recency order from the modification times,
+        # hits touch the files so the order survives between runs
+        self.index = collections.OrderedDict()
+        self.size = 0
+        entries = []
+        for name in os.listdir(cachedir):
+            if name.startswith('.'):
+                continue
+            try:
+                st = os.stat(self.path(name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, name, st.st_size))
+        for mtime, name, size in sorted(entries):
+            self.index[name] = size
+            self.size += size
+        self.evict()
+
+    @staticmethod
+    def scope(filename, argv, data = None):
+        # The results depend on the module binary, its arguments and the
+        # job data, if the workers take it
+        h = hashlib.sha256()
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        for a in argv:
+            h.update(b'\0' + a.encode('utf8'))
+        if data != None:
+            h.update(b'\0' + data.encode('utf8'))
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cachedir, key)
+
+    def Key(self, task):
+        h = hashlib.sha256(self.salt)
+        if task != None:
+            h.update(task)
+        return h.hexdigest()
+
+    def Get(self, key):
+        try:
+            with open(self.path(key), 'rb') as f:
+                res = f.read()
+            os.utime(self.path(key), None)
+        except (IOError, OSError):
+            with self.lock:
+                self.misses += 1
+                self.forget(key)
+            return None
+
+        with self.lock:
+            self.hits += 1
+            # Other processes may share the directory
+            self.forget(key)
+            self.index[key] = len(res)
+            self.size += len(res)
+        return res
+
+    def Put(self, key, res):
+        if self.limit != None and len(res) > self.limit:
+            return
+
+        # Write to a temporary file and rename it, so concurrent
+        # readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=self.cachedir, prefix='.')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(res)
+            os.rename(tmp, self.path(key))
+        except:
+            os.unlink(tmp)
+            raise
+
+        with self.lock:
+            self.forget(key)
+            self.index[key] = len(res)
+            self.size += len(res)
+            self.evict()
+
+    def Stats(self):
+        with self.lock:
+            return self.hits, self.misses, len(self.index), self.size
+
+    def forget(self, key):
+        size = self.index.pop(key, None)
+        if size != None:
+            self.size -= size
+
+    def evict(self):
+        while self.limit != None and self.size > self.limit:
+            key, size = self.index.popitem(last=False)
+            self.size -= size
+            try:
+                os.unlink(self.path(key))
+            except OSError:
+                pass
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Caian Benedicto <caian@ggaunicamp.com>
+# Copyright (c) 2016 Edson Borin <edson@ic.unicamp.br>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy 
+# of this software and associated documentation files (the "Software"), to 
+# deal in the Software without restriction, including without limitation the 
+# rights to use, copy, modify, merge, publish, distribute, sublicense, 
+# and/or sell copies of the Software, and to permit persons to whom the 
+# Software is furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in 
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR 
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL 
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER 
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING 
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS 
+# IN THE SOFTWARE.
+
+from .LargeObject import LargeObject
+
+import collections, logging, struct, tempfile, threading
+
+try:
+    import Queue as queue # Python 2
+except:
+    import queue # Python 3
+
+class ResultQueue(object):
+    """Queue of completed tasks with a memory budget, results beyond the
+    budget are appended to a spill file and read back in order"""
+
+    # taskid, result code, payload size (-1 for no payload, -2 for a
+    # large object kept aside)
+    header = struct.Struct('!qqq')
+
+    def __init__(self, budget = None, spilldir = None):
+        self.budget = budget
+        self.spilldir = spilldir
+        self.lock = threading.Lock()
+        self.memory = collections.deque()
+        self.used = 0
+        self.spill = None
+        self.spilled = 0
+        self.large = collections.deque() # Large objects in the spill order
+        self.rpos = 0
+        self.wpos = 0
+
+    def put(self, item, block = True, timeout = None):
+        taskid, r, res = item
+        size = self.weight(res)
+        with self.lock:
+            # Keep the order, once spilling everything goes to
+            # the file until it is drained
+            if self.spilled == 0 and (self.budget == None or
+                self.used + size <= self.budget):
+                self.memory.append(item)
+                self.used += size
+                return
+            self.write_spill(taskid, r, res)
+
+    def put_nowait(self, item):
+        self.put(item, False)
+
+    def get_nowait(self):
+        with self.lock:
+            if len(self.memory) > 0:
+                item = self.memory.popleft()
+                self.used -= self.weight(item[2])
+                return item
+            if self.spilled > 0:
+                return self.read_spill()
+        raise queue.Empty()
+
+    def qsize(self):
+        return len(self.memory) + self.spilled
+
+    def OverBudget(self):
+        return self.spilled > 0
+
+    def weight(self, res):
+        # Large objects are already kept on disk
+        if res == None or isinstance(res, LargeObject):
+            return 0
+        return len(res)
+
+    def write_spill(self, taskid, r, res):
+        if self.spill == None:
+            self.spill = tempfile.TemporaryFile(prefix='spits-results-',
+                dir=self.spilldir)
+        if self.spilled == 0:
+            logging.warning('Result memory budget of %d bytes exceeded, ' +
+                'spilling results to disk...', self.budget)
+        self.spill.seek(self.wpos)
+        if res == None:
+            self.spill.write(self.header.pack(taskid, r, -1))
+        elif isinstance(res, LargeObject):
+            # Already on disk, only its place in the order is kept
+            self.spill.write(self.header.pack(taskid, r, -2))
+            self.large.append(res)
+        else:
+            self.spill.write(self.header.pack(taskid, r, len(res)))
+            self.spill.write(res)
+        self.wpos = self.spill.tell()
+        self.spilled += 1
+
+    def read_spill(self):
+        self.spill.flush()
+        self.spill.seek(self.rpos)
+        taskid, r, size = self.header.unpack(
+            self.spill.read(self.header.size))
+        if size == -2:
+            res = self.large.popleft()
+        else:
+            res = None if size < 0 else self.spill.read(size)
+        self.rpos = self.spill.tell()
+        self.spilled -= 1
+        if self.spilled == 0:
+            # Everything was read back, reuse the file from the start
+            logging.info('Spilled results drained.')
+            self.spill.seek(0)
+            self.spill.truncate()
+            self.rpos = 0
+            self.wpos = 0
+        return (taskid, r, res)
@@ -23,7 +23,8 @@
 # IN THE SOFTWARE.
 
 from .Endpoint import Endpoint
-from libspitz import messaging
+from .LargeObject import LargeObject
+from libspitz import messaging, config
 
 import socket, logging
 
@@ -72,6 +73,21 @@ class SimpleEndpoint(Endpoint):
     def Write(self, data):
         self.socket.sendall(data)
 
+    def ReadPayload(self, size, timeout):
+        # Large payloads are received into a mapped file
+        if not LargeObject.Large(size):
+            return self.Read(size, timeout)
+        data = LargeObject(size, config.spill_dir)
+        messaging.recv_into(self.socket, data, timeout, config.large_chunk)
+        return data
+
+    def WritePayload(self, data):
+        if isinstance(data, LargeObject):
+            messaging.sendfile(self.socket, data.file, len(data),
+                config.large_chunk)
+        else:
+            self.socket.sendall(data)
+
     def Close(self):
         if self.socket != None:
             self.socket.close()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Caian Benedicto <caian@ggaunicamp.com>
+# Copyright (c) 2016 Edson Borin <edson@ic.unicamp.br>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy 
+# of this software and associated documentation files (the "Software"), to 
+# deal in the Software without restriction, including without limitation the 
+# rights to use, copy, modify, merge, publish, distribute, sublicense, 
+# and/or sell copies of the Software, and to permit persons to whom the 
+# Software is furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in 
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR 
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL 
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER 
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING 
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS 
+# IN THE SOFTWARE.
+
+import collections, threading
+
+class TaskBuffer(object):
+    """Bounded buffer between a task generator and the dispatcher, limited
+    by the number of tasks and their total size"""
+
+    def __init__(self, count, budget = None):
+        self.count = count
+        self.budget = budget
+        self.cond = threading.Condition()
+        self.items = collections.deque()
+        self.used = 0
+        self.closed = False
+        self.error = None # Why the generation stopped early, if it did
+
+    def full(self, size):
+        # A single item is always accepted, even if it is over budget
+        if len(self.items) == 0:
+            return False
+        return len(self.items) >= self.count or (self.budget != None and
+            self.used + size > self.budget)
+
+    def Put(self, item, size):
+        with self.cond:
+            while not self.closed and self.full(size):
+                self.cond.wait()
+            if self.closed:
+                return False
+            self.items.append((item, size))
+            self.used += size
+            self.cond.notify_all()
+            return True
+
+    def Get(self):
+        # Returns None when the buffer is closed and empty
+        with self.cond:
+            while len(self.items) == 0 and not self.closed:
+                self.cond.wait()
+            if len(self.items) == 0:
+                return None
+            item, size = self.items.popleft()
+            self.used -= size
+            self.cond.notify_all()
+            return item
+
+    def Close(self, error = None):
+        # The consumer tells an early stop from the end of the tasks
+        # by the error
+        with self.cond:
+            if error != None and self.error == None:
+                self.error = error
+            self.closed = True
+            self.cond.notify_all()
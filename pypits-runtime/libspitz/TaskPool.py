@@ -23,30 +23,139 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS 
 # IN THE SOFTWARE.
 
-import threading, sys, logging
-
-try:
-    import Queue as queue # Python 2
-except:
-    import queue # Python 3
+import collections, heapq, multiprocessing, threading, sys, logging, os, time
 
 class TaskPool(object):
     """description of class"""
 
-    def __init__(self, max_threads, overfill, initializer, worker, user_args):
+    # Seconds between the checks of the load of the machine
+    adapt_interval = 5
+
+    # Seconds between the checks of the deadlines of the running tasks
+    watchdog_interval = 1
+
+    def __init__(self, max_threads, overfill, initializer, worker, user_args,
+        finalizer = None, throttle = None, placement = None, metrics = None,
+        tidy = None, min_threads = None, idle_timeout = None,
+        load_adapt = False, deadline = None, expired = None, batch = 1,
+        batch_worker = None, batchable = None):
         self.max_threads = max_threads
+        self.overfill = overfill
         self.user_args = user_args
         self.initializer = initializer
         self.worker = worker
-        self.maxsize=max_threads+overfill
-        self.tasks = queue.Queue(maxsize=self.maxsize)
-        self.threads = [threading.Thread(target=self.runner) for
-            i in range(max_threads)]
+        self.finalizer = finalizer
+        self.throttle = throttle
+        self.placement = placement
+        self.metrics = metrics
+        self.tidy = tidy # Run by the idle workers after Wake
+        self.wakeups = 0
+        self.lock = threading.Lock()
+        self.cond = threading.Condition(self.lock)
+        self.jobs = collections.OrderedDict() # Heap of tasks of each job
+        self.size = 0
+        self.reserved = 0 # Free slots promised to tasks still arriving
+        self.seq = 0 # Tasks with the same priority are kept in order
+        self.stopping = False
+        self.queued = {} # Copies of each (job, task id) in the queues
+        self.cancelled = set()
+
+        # Threads are started as the tasks arrive, up to the limit, and
+        # the ones idle for too long are retired, down to the minimum
+        if min_threads == None:
+            min_threads = max_threads
+        self.min_threads = min(min_threads, max_threads)
+        self.idle_timeout = idle_timeout
+        self.limit = max_threads
+        self.threads = {} # Running threads by index
+        self.started = [] # Threads to join, including retiring ones
+        self.idle = 0
+
+        # Optionally leave the cpus used by other processes
+        self.load_adapt = load_adapt
+        self.adapted = 0
+        if placement:
+            self.ncpus = len(set().union(*placement))
+        else:
+            try:
+                self.ncpus = len(os.sched_getaffinity(0))
+            except AttributeError:
+                self.ncpus = multiprocessing.cpu_count()
+
+        # Tasks running past their deadline are reported as expired and
+        # their threads are replaced, the stuck threads are abandoned
+        self.deadline = deadline
+        self.expired = expired
+        self.running = {} # (job, [(task id, task)], start) by thread
+        self.abandoned = set()
+
+        # Up to batch queued tasks of a job are run in a single call
+        # of batch_worker, for the jobs accepted by batchable, the
+        # queue is deepened so the batches can be filled
+        self.batch = max(batch, 1) if batch_worker != None else 1
+        self.batch_worker = batch_worker
+        self.batchable = batchable
+
+        with self.cond:
+            for i in range(self.min_threads):
+                self.spawn()
 
-        for t in self.threads:
+        if deadline != None:
+            t = threading.Thread(target=self.watchdog)
+            t.daemon = True
             t.start()
 
-    def runner(self):
+    def spawn(self):
+        # Use the lowest free index, so the placement stays balanced
+        index = 0
+        while index in self.threads:
+            index += 1
+        logging.debug('Starting worker %d...', index)
+        t = threading.Thread(target=self.runner, args=(index,))
+        # Join waits for the threads, except the abandoned ones
+        t.daemon = True
+        self.threads[index] = t
+        self.started = [x for x in self.started if x.is_alive()] + [t]
+        t.start()
+
+    def retire(self, index):
+        logging.debug('Stopping worker %d...', index)
+        del self.threads[index]
+        return None, None
+
+    def adapt(self):
+        # Bound the threads by the cpus not used by other processes,
+        # estimated from the load average and the busy threads
+        if not self.load_adapt:
+            return
+        now = time.time()
+        if now - self.adapted < TaskPool.adapt_interval:
+            return
+        self.adapted = now
+        try:
+            load = os.getloadavg()[0]
+        except (AttributeError, OSError):
+            return
+        others = max(load - (len(self.threads) - self.idle), 0)
+        limit = min(int(self.ncpus - others + 0.5), self.max_threads)
+        limit = max(limit, self.min_threads, 1)
+        if limit != self.limit:
+            logging.info('Load average of %.2f, using up to %d workers.',
+                load, limit)
+            self.limit = limit
+
+    def runner(self, index):
+        # Pin the thread before the module allocates its state, so
+        # its memory is local to the assigned cpus
+        cpus = None
+        if self.placement:
+            cpus = self.placement[index % len(self.placement)]
+            try:
+                os.sched_setaffinity(0, cpus)
+            except (AttributeError, OSError):
+                logging.warning('Could not set the affinity of worker %d!',
+                    index)
+                cpus = None
         state = None
         try:
             # Initialize the module worker
@@ -54,25 +163,259 @@ class TaskPool(object):
         except:
             # TODO better exception handling
             pass
+        seen = self.wakeups
         while True:
-            # Pick a task from the queue and execute it
+            # Pick the tasks from the queues and execute them
             # TODO better tm kill
-            taskid, task = self.tasks.get()
+            job, tasks = self.get(index, seen)
+            if tasks == None:
+                # Stop requested by Join
+                break
+            if len(tasks) == 0:
+                # Woken up by Wake while idle
+                seen = self.wakeups
+                try:
+                    self.tidy(state, *self.user_args)
+                except:
+                    logging.error('The worker crashed while tidying up')
+                continue
+            pending = []
+            for taskid, task in tasks:
+                if self.dequeued(job, taskid):
+                    logging.debug('Skipping cancelled task %d', taskid)
+                else:
+                    pending.append((taskid, task))
+            if len(pending) == 0:
+                continue
+            start = time.time()
+            me = threading.current_thread()
+            with self.lock:
+                self.running[me] = (job, pending, start)
             try:
-                self.worker(state, taskid, task, *self.user_args)
+                if len(pending) == 1:
+                    taskid, task = pending[0]
+                    self.worker(state, taskid, task, *self.user_args)
+                else:
+                    self.batch_worker(state, pending, *self.user_args)
             except:
                 logging.error('The worker crashed while processing ' +
-                    'the task %d', taskid)
+                    'the task %d', pending[0][0])
+            with self.lock:
+                self.running.pop(me, None)
+                abandoned = me in self.abandoned
+            if self.metrics != None:
+                end = time.time()
+                for taskid, task in pending:
+                    self.metrics(taskid, index, cpus, start, end)
+            if abandoned:
+                # Already replaced by the watchdog
+                for taskid, task in pending:
+                    logging.warning('Task %d finished after its deadline.',
+                        taskid)
+                break
+        if self.finalizer != None:
+            try:
+                self.finalizer(state, *self.user_args)
+            except:
+                logging.error('The worker crashed while finalizing')
 
-    def Put(self, taskid, task):
-        try:
-            self.tasks.put_nowait((taskid, task))
-        except queue.Full:
+    def watchdog(self):
+        while True:
+            time.sleep(TaskPool.watchdog_interval)
+            expired = []
+            stuck = 0
+            with self.cond:
+                if self.stopping:
+                    return
+                now = time.time()
+                for t, (job, tasks, start) in list(self.running.items()):
+                    limit = self.deadline(job)
+                    if limit == None or now - start <= limit:
+                        continue
+                    del self.running[t]
+                    self.abandoned.add(t)
+                    for index, thread in list(self.threads.items()):
+                        if thread is t:
+                            del self.threads[index]
+                    stuck += 1
+                    for taskid, task in tasks:
+                        expired.append((job, taskid, task))
+
+                # Replace the stuck threads
+                for i in range(stuck):
+                    if len(self.threads) < self.limit:
+                        self.spawn()
+
+            for job, taskid, task in expired:
+                logging.warning('Task %d is past its deadline, its worker ' +
+                    'was replaced.', taskid)
+                if self.expired != None:
+                    try:
+                        self.expired(job, taskid, task)
+                    except:
+                        logging.error('Failed to report the expired ' +
+                            'task %d', taskid)
+
+    def get(self, index, seen):
+        # Returns no task when the thread must stop, and an empty list
+        # when it is woken up while idle
+        with self.cond:
+            self.idle += 1
+            try:
+                deadline = None
+                if self.idle_timeout != None:
+                    deadline = time.time() + self.idle_timeout
+                while True:
+                    self.adapt()
+                    if len(self.threads) > self.limit:
+                        return self.retire(index)
+                    if self.size > 0:
+                        break
+                    if self.stopping:
+                        return self.retire(index)
+                    if self.tidy != None and self.wakeups != seen:
+                        return None, []
+                    timeout = None
+                    if deadline != None:
+                        timeout = deadline - time.time()
+                        if timeout <= 0:
+                            if len(self.threads) > self.min_threads:
+                                return self.retire(index)
+                            deadline = time.time() + self.idle_timeout
+                            timeout = self.idle_timeout
+                    if self.load_adapt:
+                        timeout = min(timeout or TaskPool.adapt_interval,
+                            TaskPool.adapt_interval)
+                    self.cond.wait(timeout)
+            finally:
+                self.idle -= 1
+
+            # The jobs take turns, so the workers are shared fairly
+            # between the jobs with queued tasks
+            job, tasks = self.jobs.popitem(last=False)
+            taken = []
+            for i in range(self.drain(job, len(tasks))):
+                priority, seq, taskid, task = heapq.heappop(tasks)
+                taken.append((taskid, task))
+            if len(tasks) > 0:
+                self.jobs[job] = tasks
+            self.size -= len(taken)
+            self.cond.notify_all()
+            return job, taken
+
+    def drain(self, job, queued):
+        # Number of queued tasks of the job to run in a single call
+        if self.batch == 1:
+            return 1
+        if self.batchable != None and not self.batchable(job):
+            return 1
+        # Leave a share of the tasks to the other workers
+        share = (queued + len(self.threads) - 1) // max(len(self.threads), 1)
+        return max(min(self.batch, share), 1)
+
+    def capacity(self):
+        return self.limit * self.batch + self.overfill
+
+    def dequeued(self, job, taskid):
+        # Returns True if the task was cancelled
+        key = (job, taskid)
+        with self.lock:
+            n = self.queued.pop(key, 1) - 1
+            if n > 0:
+                self.queued[key] = n
+                return key in self.cancelled
+            if key in self.cancelled:
+                self.cancelled.discard(key)
+                return True
             return False
+
+    def Put(self, taskid, task, block = False, job = None, priority = 0,
+        reserved = False):
+        # Tasks with lower priority values are executed first, a task
+        # taking a reserved slot is always accepted
+        key = (job, taskid)
+        with self.cond:
+            if reserved:
+                self.reserved -= 1
+            while not reserved and \
+                self.size + self.reserved >= self.capacity():
+                if not block:
+                    return False
+                self.cond.wait()
+            self.queued[key] = self.queued.get(key, 0) + 1
+            heapq.heappush(self.jobs.setdefault(job, []),
+                (priority, self.seq, taskid, task))
+            self.seq += 1
+            self.size += 1
+
+            # Start a thread if the idle ones are not enough
+            if self.idle < self.size and len(self.threads) < self.limit:
+                self.spawn()
+            self.cond.notify_all()
         return True
 
+    def Cancel(self, taskids, job = None):
+        # Only tasks still in the queue can be cancelled
+        n = 0
+        with self.lock:
+            for taskid in taskids:
+                if (job, taskid) in self.queued:
+                    self.cancelled.add((job, taskid))
+                    n += 1
+        return n
+
+    def Drop(self, job):
+        # Discard the queued tasks of a job
+        with self.cond:
+            tasks = self.jobs.pop(job, ())
+            for priority, seq, taskid, task in tasks:
+                self.queued.pop((job, taskid), None)
+                self.cancelled.discard((job, taskid))
+            self.size -= len(tasks)
+            self.cond.notify_all()
+            return len(tasks)
+
+    def Wake(self):
+        # Let the idle workers run tidy, such as after a job ended
+        with self.cond:
+            self.wakeups += 1
+            self.cond.notify_all()
+
+    def Join(self):
+        # Stop the threads after the tasks already queued
+        with self.cond:
+            self.stopping = True
+            self.cond.notify_all()
+            started = [t for t in self.started if t not in self.abandoned]
+        for t in started:
+            t.join()
+
     def Free(self):
-        return self.maxsize-self.tasks.qsize()
+        # Report no capacity while the consumer of the results is behind
+        if self.throttle != None and self.throttle():
+            return 0
+        with self.cond:
+            self.adapt()
+            return max(self.capacity() - self.size - self.reserved, 0)
+
+    def Reserve(self):
+        # Hold the free slots for the tasks about to be received, so
+        # they are not offered again before the tasks are put
+        if self.throttle != None and self.throttle():
+            return 0
+        with self.cond:
+            self.adapt()
+            n = max(self.capacity() - self.size - self.reserved, 0)
+            self.reserved += n
+            return n
+
+    def Release(self, n):
+        # Give back the reserved slots that were not used
+        if n <= 0:
+            return
+        with self.cond:
+            self.reserved -= n
+            self.cond.notify_all()
 
     def Full(self):
-        return self.tasks.full()
+        return self.Free() <= 0
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Caian Benedicto <caian@ggaunicamp.com>
+# Copyright (c) 2016 Edson Borin <edson@ic.unicamp.br>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy 
+# of this software and associated documentation files (the "Software"), to 
+# deal in the Software without restriction, including without limitation the 
+# rights to use, copy, modify, merge, publish, distribute, sublicense, 
+# and/or sell copies of the Software, and to permit persons to whom the 
+# Software is furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in 
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR 
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL 
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER 
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING 
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS 
+# IN THE SOFTWARE.
+
+import logging, multiprocessing, os, re
+
+class Topology(object):
+    """CPU and NUMA node layout of the host as exposed in sysfs"""
+
+    nodepath = '/sys/devices/system/node'
+
+    def __init__(self, nodepath = None):
+        if nodepath != None:
+            self.nodepath = nodepath
+
+        # Only consider the cpus the process is allowed to run on
+        try:
+            self.cpus = set(os.sched_getaffinity(0))
+        except AttributeError:
+            self.cpus = set(range(multiprocessing.cpu_count()))
+
+        self.nodes = []
+        try:
+            names = os.listdir(self.nodepath)
+        except OSError:
+            names = []
+        for name in names:
+            m = re.match(r'^node(\d+)$', name)
+            if not m:
+                continue
+            try:
+                with open(os.path.join(self.nodepath, name, 'cpulist')) as f:
+                    cpus = Topology.parse_cpulist(f.read())
+            except (IOError, OSError, ValueError):
+                continue
+            cpus = cpus & self.cpus
+            if len(cpus) > 0:
+                self.nodes.append((int(m.group(1)), cpus))
+        self.nodes.sort()
+
+        # Without NUMA information the host is a single node
+        if len(self.nodes) == 0:
+            self.nodes = [(0, set(self.cpus))]
+
+    @staticmethod
+    def parse_cpulist(s):
+        # Parse the kernel cpu list format, e.g. 0-3,8,10-11
+        cpus = set()
+        for part in s.strip().split(','):
+            if part == '':
+                continue
+            if '-' in part:
+                a, b = part.split('-')
+                cpus.update(range(int(a), int(b) + 1))
+            else:
+                cpus.add(int(part))
+        return cpus
+
+    @staticmethod
+    def format_cpulist(cpus):
+        ranges = []
+        for c in sorted(cpus):
+            if len(ranges) > 0 and ranges[-1][1] == c - 1:
+                ranges[-1][1] = c
+            else:
+                ranges.append([c, c])
+        return ','.join(('%d' % a) if a == b else ('%d-%d' % (a, b))
+            for a, b in ranges)
+
+    def Nodes(self):
+        return self.nodes
+
+    def Cores(self):
+        # Interleave the nodes so consecutive workers spread
+        # across the sockets
+        cores = []
+        lists = [sorted(cpus) for node, cpus in self.nodes]
+        for i in range(max(len(l) for l in lists)):
+            cores.extend(l[i] for l in lists if i < len(l))
+        return cores
+
+    def Placement(self, mode, cpus = None):
+        # List of cpu sets to pin the workers to, in turns, or None
+        # to leave the placement to the operating system
+        if mode == 'core':
+            return [set([c]) for c in self.Cores() if cpus == None or
+                c in cpus]
+        elif mode == 'numa':
+            return [c for node, c in self.nodes if cpus == None or
+                len(c & cpus) > 0]
+        elif mode == 'none':
+            return None
+        raise ValueError('Unknown placement mode \'%s\'!' % mode)
@@ -23,13 +23,28 @@
 # IN THE SOFTWARE.
 
 from .JobBinary import JobBinary
+from .JobModule import JobModule
+from .Job import Job
 
 from .Endpoint import Endpoint
 from .SimpleEndpoint import SimpleEndpoint
 from .ClientEndpoint import ClientEndpoint
 
 from .Listener import Listener
+from .Liveness import Liveness
+from .JobStatus import JobStatus
 from .TaskPool import TaskPool
+from .TaskBuffer import TaskBuffer
+from .LargeObject import LargeObject
+from .ResultQueue import ResultQueue
+from .ResultBatch import ResultBatch
+from .ReorderBuffer import ReorderBuffer
+from .Topology import Topology
+from .DataCache import DataCache
+from .ResultCache import ResultCache
+
+from .OStream import OStream
+from .IStream import IStream
 
 def main():
     pass
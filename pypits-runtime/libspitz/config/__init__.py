@@ -30,10 +30,48 @@ conn_timeout = None
 send_backoff = 0.05
 recv_backoff = 0.05
 
+result_budget = 512 * 1024 * 1024
+large_payload = 64 * 1024 * 1024
+large_chunk = 4 * 1024 * 1024
+spill_dir = None
+data_cache_dir = None
+result_cache_size = 1024 * 1024 * 1024
+reorder_window = 1024
+reorder_budget = 256 * 1024 * 1024
+reorder_stall = 10
+prefetch_tasks = 64
+prefetch_budget = 64 * 1024 * 1024
+commit_batch = 64
+commit_batch_budget = 16 * 1024 * 1024
+commit_batch_latency = 1
+
+worker_idle_timeout = 60
+worker_batch = 1
+task_deadline = None
+
+heartbeat_interval = 5
+heartbeat_timeout = 2
+heartbeat_misses = 2
+quarantine_backoff = 5
+quarantine_max_backoff = 300
+
+register_interval = 10
+
+priority_retry = -(1 << 48)
+
 spitz_jm_port = 7726
 spitz_tm_port = 7727
 
+affinity_none = 'none'
+affinity_core = 'core'
+affinity_numa = 'numa'
+
 mode_tcp = 'tcp'
 mode_uds = 'uds'
 
 announce_cat_nodes = 'cat'
+announce_register = 'register'
+
+log_level = 'debug'
+log_sample = 1000
+log_interval = 10
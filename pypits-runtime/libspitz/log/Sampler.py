@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Caian Benedicto <caian@ggaunicamp.com>
+# Copyright (c) 2016 Edson Borin <edson@ic.unicamp.br>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy 
+# of this software and associated documentation files (the "Software"), to 
+# deal in the Software without restriction, including without limitation the 
+# rights to use, copy, modify, merge, publish, distribute, sublicense, 
+# and/or sell copies of the Software, and to permit persons to whom the 
+# Software is furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in 
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR 
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL 
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER 
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING 
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS 
+# IN THE SOFTWARE.
+
+from libspitz import config
+
+import logging, threading, time
+
+class Sampler(object):
+    """Rate limited logging of per-task events with periodic summaries"""
+
+    def __init__(self, what, every = None, interval = None):
+        self.what = what
+        self.every = config.log_sample if every == None else every
+        self.interval = config.log_interval if interval == None else interval
+        self.lock = threading.Lock()
+        self.total = 0
+        self.count = 0
+        self.last = time.time()
+
+    def Log(self, level, msg, *args):
+        # Count the event and check if a summary is due
+        with self.lock:
+            self.total += 1
+            self.count += 1
+            total = self.total
+            now = time.time()
+            if now - self.last >= self.interval:
+                self.summary(now)
+
+        # Only forward one of every n messages
+        if self.every > 0 and (total - 1) % self.every == 0 and \
+            logging.getLogger().isEnabledFor(level):
+            logging.log(level, msg, *args)
+
+    def Flush(self):
+        with self.lock:
+            if self.count > 0:
+                self.summary(time.time())
+
+    def summary(self, now):
+        # Must be called with the lock held
+        elapsed = max(now - self.last, 1e-6)
+        logging.info('%d %s in the last %.1fs (%.1f/s, %d total).',
+            self.count, self.what, elapsed, self.count / elapsed, self.total)
+        self.count = 0
+        self.last = now
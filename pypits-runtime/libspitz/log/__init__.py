@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Caian Benedicto <caian@ggaunicamp.com>
+# Copyright (c) 2016 Edson Borin <edson@ic.unicamp.br>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy 
+# of this software and associated documentation files (the "Software"), to 
+# deal in the Software without restriction, including without limitation the 
+# rights to use, copy, modify, merge, publish, distribute, sublicense, 
+# and/or sell copies of the Software, and to permit persons to whom the 
+# Software is furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in 
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR 
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL 
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER 
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING 
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS 
+# IN THE SOFTWARE.
+
+from .Sampler import Sampler
+
+import logging
+
+try:
+    import Queue as queue # Python 2
+except:
+    import queue # Python 3
+
+try:
+    from logging.handlers import QueueHandler, QueueListener
+except:
+    # Python 2 does not provide queue based handlers
+    QueueHandler = None
+    QueueListener = None
+
+# Convert a level name (debug, info...) or number to a logging level
+def parse_level(level):
+    try:
+        return int(level)
+    except ValueError:
+        pass
+    v = logging.getLevelName(level.upper())
+    if not isinstance(v, int):
+        raise ValueError('Unknown log level \'%s\'!' % level)
+    return v
+
+# Attach the handler to the logger through a background thread, so the
+# threads emitting the messages do not block on formatting and writing
+def start_async(logger, handler):
+    if QueueHandler == None:
+        logger.addHandler(handler)
+        return None
+    q = queue.Queue(-1)
+    logger.addHandler(QueueHandler(q))
+    listener = QueueListener(q, handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+# Flush the pending messages and stop the background thread
+def stop_async(listener):
+    if listener != None:
+        listener.stop()
@@ -39,6 +39,22 @@ msg_send_rjct = 0x0204
 msg_read_result = 0x0101
 msg_read_empty = 0x0000
 
+msg_cancel_task = 0x0301
+
+msg_send_data = 0x0401
+msg_need_data = -0x0401
+
+msg_send_job = 0x0501
+msg_end_job = 0x0502
+msg_select_job = 0x0503
+msg_unknown_job = -0x0501
+
+msg_heartbeat = 0x0601
+
+msg_register = 0x0701
+msg_deregister = 0x0702
+msg_query_status = 0x0801
+
 msg_terminate = 0xFFFF
 
 # Signal the spitz system through the upper 32
@@ -48,10 +64,14 @@ res_module_error = 0xFFFFFFFF00000000
 res_module_noans = 0xFFFFFFFE00000000
 res_module_ctxer = 0xFFFFFFFD00000000
 
+# Same bits as 0xFFFFFFFC00000000, signed so it can be
+# sent to the job manager
+res_module_timeout = -0x0000000400000000
+
 # Definition of the recv method for sockets, considering
 # a definite size and timeout
 def recv(conn, size, timeout):
-    r = None
+    r = []
     left = size
     while left > 0:
         ready = select.select([conn], [], [], timeout)
@@ -60,6 +80,36 @@ def recv(conn, size, timeout):
         d = conn.recv(left)
         if len(d) == 0:
             raise SocketClosed()
-        r = r + d if r else d
-        left = size - len(r)
-    return r
+        r.append(d)
+        left = left - len(d)
+    if len(r) == 1:
+        return r[0]
+    return b''.join(r) if len(r) > 0 else None
+
+# Receive straight into a writable buffer, in chunks
+def recv_into(conn, buf, timeout, chunk):
+    view = memoryview(buf)
+    pos = 0
+    while pos < len(view):
+        ready = select.select([conn], [], [], timeout)
+        if not ready[0]:
+            raise TimeoutError()
+        n = conn.recv_into(view[pos:pos + chunk])
+        if n == 0:
+            raise SocketClosed()
+        pos = pos + n
+
+# Send a region of a file, in chunks, without reading it to memory
+# when the platform has sendfile
+def sendfile(conn, f, size, chunk):
+    if hasattr(conn, 'sendfile'):
+        conn.sendfile(f, 0, size)
+        return
+    f.seek(0)
+    left = size
+    while left > 0:
+        d = f.read(min(left, chunk))
+        if len(d) == 0:
+            raise SocketClosed()
+        conn.sendall(d)
+        left = left - len(d)
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Caian Benedicto <caian@ggaunicamp.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy 
+# of this software and associated documentation files (the "Software"), to 
+# deal in the Software without restriction, including without limitation the 
+# rights to use, copy, modify, merge, publish, distribute, sublicense, 
+# and/or sell copies of the Software, and to permit persons to whom the 
+# Software is furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in 
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR 
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL 
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER 
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING 
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS 
+# IN THE SOFTWARE.
+
+
+from libspitz import SimpleEndpoint, JobStatus
+from libspitz import messaging, config
+
+import Args
+import sys, time
+
+# Global configuration parameters
+mon_addr = None # Address of the job manager
+mon_port = None # Port of the job manager
+mon_interval = None # Seconds between queries
+mon_timeout = None # Connect and receive timeout
+mon_total = None # Number of tasks of the job, if known, for the ETA
+mon_top = None # Task managers listed, the fastest first, 0 for all
+mon_once = None # Print a single report and exit
+
+###############################################################################
+# Parse global configuration
+###############################################################################
+def parse_global_config(argdict):
+    global mon_addr, mon_port, mon_interval, mon_timeout, mon_total, \
+        mon_top, mon_once
+
+    mon_addr = argdict.get('jmaddr', 'localhost')
+    mon_port = int(argdict.get('jmport', config.spitz_jm_port))
+    mon_interval = max(float(argdict.get('interval', 1)), 0.1)
+    mon_timeout = float(argdict.get('timeout', 5))
+    mon_total = argdict.get('total', None)
+    if mon_total != None:
+        mon_total = int(mon_total)
+    mon_top = max(int(argdict.get('top', 20)), 0)
+    mon_once = int(argdict.get('once', 0)) != 0
+
+###############################################################################
+# Query the progress of the job from the job manager
+###############################################################################
+def query(jm, detail):
+    jm.Open(mon_timeout)
+    try:
+        jm.WriteInt64(messaging.msg_query_status)
+        jm.WriteInt64(1 if detail else 0)
+        if jm.ReadInt64(mon_timeout) != messaging.msg_query_status:
+            raise messaging.MessagingError()
+        size = jm.ReadInt64(mon_timeout)
+        return JobStatus.Unpack(jm.Read(size, mon_timeout))
+    finally:
+        jm.Close()
+
+###############################################################################
+# Format a duration in seconds
+###############################################################################
+def duration(seconds):
+    if seconds == None:
+        return '?'
+    seconds = int(seconds)
+    return '%d:%02d:%02d' % (seconds // 3600, seconds // 60 % 60,
+        seconds % 60)
+
+###############################################################################
+# Format a counter reported by the job manager, -1 is unknown
+###############################################################################
+def counter(value):
+    return '-' if value < 0 else str(value)
+
+###############################################################################
+# Estimate the seconds left from the commit rate
+###############################################################################
+def eta(status, rate):
+    # The number of tasks is only known after the generation ends
+    if mon_total != None:
+        left = mon_total - status['committed']
+    elif status['finished']:
+        left = status['generated'] - status['committed']
+    else:
+        return None
+    if left <= 0:
+        return 0
+    if rate <= 0:
+        return None
+    return left / rate
+
+###############################################################################
+# Print a report of the progress
+###############################################################################
+def report(status, rate, tmrates, clear):
+    lines = []
+    lines.append('Job %d, running for %s%s' % (status['jobid'],
+        duration(status['elapsed']),
+        ', all tasks generated' if status['finished'] else ''))
+    lines.append('Tasks: %d generated, %d in flight, %d committed, '
+        '%d retransmitted' % (status['generated'], status['inflight'],
+        status['committed'], status['retransmitted']))
+    lines.append('Rate: %.1f tasks/s, ETA %s' % (rate,
+        duration(eta(status, rate))))
+    lines.append('')
+    lines.append('%-32s %10s %10s %10s %10s %6s' % ('TASK MANAGER',
+        'TASKS/S', 'COMPLETED', 'FREE', 'BACKLOG', 'ALIVE'))
+
+    tms = sorted(status['tms'].items(), key=lambda x: -tmrates.get(x[0], 0))
+    if mon_top > 0:
+        tms = tms[:mon_top]
+    for name, (completed, free, backlog, alive) in tms:
+        lines.append('%-32s %10.1f %10d %10s %10s %6s' % (name[:32],
+            tmrates.get(name, 0), completed, counter(free),
+            counter(backlog), 'yes' if alive else 'no'))
+    if len(status['tms']) > len(tms):
+        lines.append('... %d more task managers' %
+            (len(status['tms']) - len(tms)))
+
+    if clear:
+        # Redraw in place, like top
+        sys.stdout.write('\033[H\033[J')
+    else:
+        lines.append('')
+    sys.stdout.write('\n'.join(lines) + '\n')
+    sys.stdout.flush()
+
+###############################################################################
+# Monitor routine
+###############################################################################
+def monitor():
+    jm = SimpleEndpoint(mon_addr, mon_port)
+    clear = sys.stdout.isatty() and not mon_once
+    last = None
+    rate = 0.0
+    while True:
+        try:
+            status = query(jm, True)
+        except:
+            if last == None:
+                sys.stderr.write('Could not query the job manager at '
+                    '%s:%d!\n' % (mon_addr, mon_port))
+                return 1
+            # The job manager exits with the job
+            sys.stderr.write('The job manager at %s:%d is gone.\n' %
+                (mon_addr, mon_port))
+            return 0
+
+        # The rates are measured between two queries, the first
+        # one is measured since the start of the job
+        if last == None:
+            dt = status['elapsed']
+            prev = {'committed': 0, 'tms': {}}
+        else:
+            dt = status['elapsed'] - last['elapsed']
+            prev = last
+        tmrates = {}
+        if dt > 0:
+            now = (status['committed'] - prev['committed']) / dt
+            # Smooth the rate used for the ETA
+            rate = now if last == None else 0.5 * rate + 0.5 * now
+            for name, tm in status['tms'].items():
+                before = prev['tms'].get(name, (0,))[0]
+                tmrates[name] = (tm[0] - before) / dt
+
+        report(status, rate, tmrates, clear)
+        last = status
+        if mon_once:
+            return 0
+        time.sleep(mon_interval)
+
+###############################################################################
+# Main routine
+###############################################################################
+def main(argv):
+    # Parse the arguments
+    args = Args.Args(argv)
+    parse_global_config(args.args)
+
+    try:
+        r = monitor()
+    except KeyboardInterrupt:
+        r = 0
+    sys.exit(r)
+
+###############################################################################
+# Entry point
+###############################################################################
+if __name__ == '__main__':
+    main(sys.argv)
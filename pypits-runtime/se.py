@@ -22,64 +22,105 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS 
 # IN THE SOFTWARE.
 
-from libspitz import JobBinary, SimpleEndpoint
-from libspitz import messaging, config
+from libspitz import JobBinary, JobModule, SimpleEndpoint, TaskPool
+from libspitz import messaging, config, log
 
 import Args
 import sys, threading, os, time, ctypes, logging, struct, threading, traceback
 
+try:
+    import Queue as queue # Python 2
+except:
+    import queue # Python 3
+
+# Global configuration parameters
+se_log_level = log.parse_level(config.log_level) # Logging verbosity
+se_log_sample = config.log_sample # Log one of every n per-task messages
+se_log_interval = config.log_interval # Seconds between log summaries
+se_log_listener = None # Background thread writing the log
+se_log_processed = None # Sampled log of processed tasks
+se_nw = 0 # Number of parallel workers, zero runs serially
+se_overfill = 0 # Extra space in the task queue
+se_result_file = None # File receiving the final result
+
 ###############################################################################
 # Parse global configuration
 ###############################################################################
 def parse_global_config(argdict):
-    pass
+    global se_log_level, se_log_sample, se_log_interval, se_nw, \
+        se_overfill, se_result_file
+
+    se_nw = max(int(argdict.get('nw', 0)), 0)
+    se_overfill = max(int(argdict.get('overfill', 0)), 0)
+    se_result_file = argdict.get('resultfile', None)
+    se_log_level = log.parse_level(argdict.get('loglevel', config.log_level))
+    se_log_sample = int(argdict.get('logsample', config.log_sample))
+    se_log_interval = float(argdict.get('loginterval', config.log_interval))
 
 ###############################################################################
 # Configure the log output format
 ###############################################################################
 def setup_log():
+    global se_log_listener, se_log_processed
     root = logging.getLogger()
-    root.setLevel(logging.DEBUG)
+    root.setLevel(se_log_level)
     root.handlers = []
     ch = logging.StreamHandler(sys.stderr)
-    ch.setLevel(logging.DEBUG)
+    ch.setLevel(se_log_level)
     formatter = logging.Formatter('%(asctime)s - %(threadName)s - '+
         '%(levelname)s - %(message)s')
     ch.setFormatter(formatter)
-    root.addHandler(ch)
+    se_log_listener = log.start_async(root, ch)
+
+    # Per-task messages are sampled and summarized
+    se_log_processed = log.Sampler('tasks processed',
+        se_log_sample, se_log_interval)
+
+###############################################################################
+# Flush the log before leaving
+###############################################################################
+def finish_log():
+    if se_log_processed != None:
+        se_log_processed.Flush()
+    log.stop_async(se_log_listener)
 
 ###############################################################################
 # Abort the aplication with message
 ###############################################################################
 def abort(error):
     logging.critical(error)
+    finish_log()
     exit(1)
 
 
 ###############################################################################
 # Run routine
 ###############################################################################
-def run(argv, job):
-    jm = job.spits_job_manager_new(argv)
-    co = job.spits_committer_new(argv)
-    wk = job.spits_worker_new(argv)
+def run(argv, jobinfo, job):
+    jm = job.spits_job_manager_new(argv, jobinfo)
+    co = job.spits_committer_new(argv, jobinfo)
+    wk = job.spits_worker_new_with_data(argv, jobinfo)
     taskid = 0
 
     while True:
         taskid += 1
 
-        r1, task = job.spits_job_manager_next_task(jm)
+        r1, task, ctx = job.spits_job_manager_next_task(jm, taskid)
         
         if r1 == 0:
             break
 
-        logging.debug('Generated task %d.', taskid)
+        if task == None:
+            logging.error('Task %d was not pushed!', taskid)
+            continue
 
-        logging.info('Processing task %d...', taskid)
+        if ctx != taskid:
+            logging.error('Context verification failed for task %d!', taskid)
+            continue
 
-        r2, res, ctx = job.spits_worker_run(wk, task, taskid)
+        r2, res, ctx = job.spits_worker_run(wk, task[0], taskid)
 
-        logging.info('Task %d processed.', taskid)
+        se_log_processed.Log(logging.DEBUG, 'Task %d processed.', taskid)
 
         if res == None:
             logging.error('Task %d did not push any result!', taskid)
@@ -98,10 +139,18 @@ def run(argv, job):
 
     job.spits_job_manager_finalize(jm)
 
+    return commit_job(job, co, [wk])
+
+###############################################################################
+# Commit the job and finalize the remaining modules
+###############################################################################
+def commit_job(job, co, workers):
     logging.info('Committing Job...')
-    r, res, ctx = job.spits_committer_commit_job(co, 0x12345678)
+    r, res, ctx = job.spits_committer_commit_job(co, 0x12345678,
+        se_result_file)
 
-    job.spits_worker_finalize(wk)
+    for wk in workers:
+        job.spits_worker_finalize(wk)
 
     if res == None:
         logging.error('Job did not push any result!')
@@ -113,14 +162,133 @@ def run(argv, job):
 
     return r, res[0]
 
+###############################################################################
+# Initializer routine for the parallel workers
+###############################################################################
+def initializer(cqueue, job, argv, jobinfo, workers):
+    logging.info('Initializing worker...')
+    state = job.spits_worker_new_with_data(argv, jobinfo)
+    workers.append(state)
+    return state
+
+###############################################################################
+# Worker routine for the parallel workers
+###############################################################################
+def worker(state, taskid, task, cqueue, job, argv, jobinfo, workers):
+    # Results without payload are still sent to the committer, which
+    # must see every task id to keep the commit order
+    res = None
+    r = messaging.res_module_error
+    try:
+        r, res, ctx = job.spits_worker_run(state, task, taskid)
+
+        se_log_processed.Log(logging.DEBUG, 'Task %d processed.', taskid)
+
+        if res == None:
+            logging.error('Task %d did not push any result!', taskid)
+        elif ctx != taskid:
+            logging.error('Context verification failed for task %d!', taskid)
+            res = None
+        else:
+            res = res[0]
+    finally:
+        cqueue.put((taskid, r, res))
+
+###############################################################################
+# Task generator for the parallel mode
+###############################################################################
+def generator(job, jm, tpool, cqueue, window):
+    taskid = 0
+
+    while True:
+        # Limit the number of tasks not yet committed
+        window.acquire()
+        taskid += 1
+
+        r1, task, ctx = job.spits_job_manager_next_task(jm, taskid)
+
+        if r1 == 0:
+            break
+
+        if task == None:
+            logging.error('Task %d was not pushed!', taskid)
+            cqueue.put((taskid, messaging.res_module_noans, None))
+            continue
+
+        if ctx != taskid:
+            logging.error('Context verification failed for task %d!', taskid)
+            cqueue.put((taskid, messaging.res_module_ctxer, None))
+            continue
+
+        tpool.Put(taskid, task[0], True)
+
+    # Tell the committer how many tasks were generated
+    cqueue.put((None, taskid - 1, None))
+
+###############################################################################
+# Committer for the parallel mode, commits in the generation order
+###############################################################################
+def committer(job, co, cqueue, window):
+    pending = {}
+    nexttask = 1
+    total = None
+
+    while total == None or nexttask <= total:
+        taskid, r, res = cqueue.get()
+
+        if taskid == None:
+            total = r
+            continue
+
+        pending[taskid] = res
+
+        while nexttask in pending:
+            res = pending.pop(nexttask)
+            if res != None:
+                r3 = job.spits_committer_commit_pit(co, res)
+                if r3 != 0:
+                    logging.error('The task %d was not successfully ' +
+                        'committed, committer returned %d', nexttask, r3)
+            nexttask += 1
+            window.release()
+
+###############################################################################
+# Parallel run routine
+###############################################################################
+def run_parallel(argv, jobinfo, job):
+    jm = job.spits_job_manager_new(argv, jobinfo)
+    co = job.spits_committer_new(argv, jobinfo)
+
+    # Create a work pool and a commit queue, the worker states are kept
+    # so they can be finalized after the job is committed
+    workers = []
+    cqueue = queue.Queue()
+    tpool = TaskPool(se_nw, se_overfill, initializer, worker,
+        (cqueue, job, argv, jobinfo, workers))
+    window = threading.Semaphore(2 * (se_nw + se_overfill))
+
+    logging.info('Running with %d workers...', se_nw)
+
+    gthread = threading.Thread(target=generator,
+        args=(job, jm, tpool, cqueue, window))
+    cthread = threading.Thread(target=committer,
+        args=(job, co, cqueue, window))
+    gthread.start()
+    cthread.start()
+
+    # Stop the workers after all tasks were generated
+    gthread.join()
+    tpool.Join()
+    cthread.join()
+
+    job.spits_job_manager_finalize(jm)
+
+    return commit_job(job, co, workers)
+
 ###############################################################################
 # Main routine
 ###############################################################################
 def main(argv):
-    # Setup logging
-    setup_log()
-    logging.debug('Hello!')
-
     # Print usage
     if len(argv) <= 1:
         abort('USAGE: jm module [module args]')
@@ -129,16 +297,23 @@ def main(argv):
     args = Args.Args(argv)
     parse_global_config(args.args)
 
+    # Setup logging
+    setup_log()
+    logging.debug('Hello!')
+
     # Load the module
     module = args.margs[0]
-    job = JobBinary(module)
+    job = JobModule(module) if JobModule.is_python(module) \
+        else JobBinary(module)
 
     # Remove JM arguments when passing to the module
     margv = args.margs
 
     # Wrapper to include job module
-    def run_wrapper(argv):
-        return run(argv, job)
+    def run_wrapper(argv, jobinfo):
+        if se_nw > 0:
+            return run_parallel(argv, jobinfo, job)
+        return run(argv, jobinfo, job)
 
     # Run the module
     logging.info('Running module')
@@ -146,6 +321,7 @@ def main(argv):
 
     # Finalize
     logging.debug('Bye!')
+    finish_log()
     #exit(r)
 
 ###############################################################################
@@ -0,0 +1,38 @@
+import time
+
+from libspitz import Liveness
+
+def test_dead_after_the_misses():
+    l = Liveness(2, 10, 60)
+    assert not l.Missed('tm')
+    assert l.Available('tm')
+    assert l.Missed('tm')
+    assert not l.Available('tm')
+    assert not l.Due('tm')
+    # Already dead
+    assert not l.Missed('tm')
+
+def test_back_from_the_quarantine():
+    l = Liveness(1, 10, 60)
+    l.Alive('tm', 1)
+    assert l.Missed('tm')
+    assert not l.Alive('tm', 1)
+    assert l.Available('tm')
+    assert l.Due('tm')
+
+def test_restart_detected_by_the_instance():
+    l = Liveness(1, 10, 60)
+    assert not l.Alive('tm', 1)
+    assert not l.Alive('tm', 1)
+    assert l.Alive('tm', 2)
+
+def test_quarantine_backoff():
+    l = Liveness(1, 0.05, 0.1)
+    assert l.Missed('tm')
+    assert not l.Due('tm')
+    time.sleep(0.1)
+    assert l.Due('tm')
+    # The second death doubles the quarantine, up to the limit
+    l.Missed('tm')
+    until = l.nodes['tm'][2] - time.time()
+    assert 0.05 < until <= 0.1
@@ -0,0 +1,49 @@
+import time
+
+from libspitz import ReorderBuffer
+
+def test_results_released_in_task_order():
+    b = ReorderBuffer(10)
+    b.Put(3, 0, b'c')
+    b.Put(2, 0, b'b')
+    assert b.Pop() == None
+    b.Put(1, 0, b'a')
+    assert b.Pop() == (1, 0, b'a')
+    assert b.Pop() == (2, 0, b'b')
+    assert b.Pop() == (3, 0, b'c')
+    assert b.Pop() == None
+    assert b.Next() == 4
+    assert b.Pending() == 0
+
+def test_window():
+    b = ReorderBuffer(4)
+    assert not b.Full(4)
+    assert b.Full(5)
+    b.Put(1, 0, b'a')
+    b.Pop()
+    assert not b.Full(5)
+
+def test_spill_beyond_the_budget(tmp_path):
+    b = ReorderBuffer(100, 4, str(tmp_path))
+    for taskid in range(5, 1, -1):
+        b.Put(taskid, taskid, b'x' * 3)
+    b.Put(6, 1, None)
+    b.Put(1, 0, b'a')
+    assert [b.Pop() for i in range(6)] == [(1, 0, b'a')] + \
+        [(taskid, taskid, b'xxx') for taskid in range(2, 6)] + [(6, 1, None)]
+    assert b.Pending() == 0
+    assert b.wpos == 0
+
+def test_stall_reported_once_per_timeout():
+    b = ReorderBuffer(4)
+    assert not b.Stalled(0.05)
+    time.sleep(0.1)
+    assert b.Stalled(0.05)
+    assert not b.Stalled(0.05)
+
+def test_progress_clears_the_stall():
+    b = ReorderBuffer(4)
+    time.sleep(0.1)
+    b.Put(1, 0, b'a')
+    b.Pop()
+    assert not b.Stalled(0.05)
@@ -0,0 +1,32 @@
+import time
+
+from libspitz import ResultBatch
+
+def test_full_by_count():
+    b = ResultBatch(3)
+    assert not b.Add(1, 0, b'a')
+    assert not b.Add(2, 0, b'b')
+    assert b.Add(3, 0, b'c')
+    assert b.Take() == [(1, 0, b'a'), (2, 0, b'b'), (3, 0, b'c')]
+    assert len(b) == 0
+    assert not b.Due()
+
+def test_full_by_budget():
+    b = ResultBatch(100, 10)
+    assert not b.Add(1, 0, b'x' * 6)
+    assert b.Add(2, 0, b'x' * 6)
+
+def test_missing_results_weigh_nothing():
+    b = ResultBatch(100, 1)
+    assert not b.Add(1, 0, None)
+    assert b.used == 0
+
+def test_due_after_latency():
+    b = ResultBatch(100, None, 0.05)
+    assert not b.Due()
+    b.Add(1, 0, b'a')
+    assert not b.Due()
+    time.sleep(0.1)
+    assert b.Due()
+    b.Take()
+    assert not b.Due()
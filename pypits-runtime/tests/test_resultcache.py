@@ -0,0 +1,44 @@
+import os
+
+from libspitz import ResultCache
+
+def test_put_and_get(tmp_path):
+    c = ResultCache(str(tmp_path))
+    key = c.Key(b'task')
+    assert c.Get(key) == None
+    c.Put(key, b'result')
+    assert c.Get(key) == b'result'
+    assert c.Stats() == (1, 1, 1, 6)
+
+def test_keys_depend_on_the_scope(tmp_path):
+    a = ResultCache(str(tmp_path), salt='a')
+    b = ResultCache(str(tmp_path), salt='b')
+    assert a.Key(b'task') != b.Key(b'task')
+    assert a.Key(b'task') == ResultCache(str(tmp_path), salt='a').Key(b'task')
+
+def test_least_recently_used_evicted(tmp_path):
+    c = ResultCache(str(tmp_path), 10)
+    c.Put('a', b'1234')
+    c.Put('b', b'1234')
+    assert c.Get('a') == b'1234'
+    c.Put('c', b'1234')
+    assert c.Get('b') == None
+    assert c.Get('a') == b'1234'
+    assert c.Get('c') == b'1234'
+    assert c.Stats()[2:] == (2, 8)
+    assert sorted(os.listdir(str(tmp_path))) == ['a', 'c']
+
+def test_results_over_the_limit_not_stored(tmp_path):
+    c = ResultCache(str(tmp_path), 3)
+    c.Put('a', b'1234')
+    assert c.Get('a') == None
+
+def test_recency_survives_a_restart(tmp_path):
+    c = ResultCache(str(tmp_path))
+    c.Put('a', b'1234')
+    c.Put('b', b'1234')
+    os.utime(c.path('a'), (1, 1))
+    os.utime(c.path('b'), (2, 2))
+    c = ResultCache(str(tmp_path), 4)
+    assert c.Get('a') == None
+    assert c.Get('b') == b'1234'
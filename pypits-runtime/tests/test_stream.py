@@ -0,0 +1,108 @@
+import pytest
+
+from libspitz import IStream, OStream
+
+def test_scalars_round_trip():
+    o = OStream()
+    o.WriteBool(True)
+    o.WriteChar(-5)
+    o.WriteByte(250)
+    o.WriteShort(-1234)
+    o.WriteUShort(65000)
+    o.WriteInt(-123456789)
+    o.WriteUInt(4000000000)
+    o.WriteLongLong(-(1 << 60))
+    o.WriteULongLong((1 << 64) - 1)
+    o.WriteFloat(1.5)
+    o.WriteDouble(-2.25)
+    i = IStream(o.Data())
+    assert i.ReadBool() == True
+    assert i.ReadChar() == -5
+    assert i.ReadByte() == 250
+    assert i.ReadShort() == -1234
+    assert i.ReadUShort() == 65000
+    assert i.ReadInt() == -123456789
+    assert i.ReadUInt() == 4000000000
+    assert i.ReadLongLong() == -(1 << 60)
+    assert i.ReadULongLong() == (1 << 64) - 1
+    assert i.ReadFloat() == 1.5
+    assert i.ReadDouble() == -2.25
+    assert not i.HasData()
+
+def test_big_endian_layout():
+    o = OStream()
+    o.WriteInt(1)
+    o.WriteString('ab')
+    assert o.Data() == b'\0\0\0\1ab\0'
+
+def test_strings_round_trip():
+    o = OStream()
+    for s in ('', 'spits', u'\u00e7\u00e3o', ''):
+        o.WriteString(s)
+    o.WriteInt(7)
+    i = IStream(o.Data())
+    assert [i.ReadString() for n in range(4)] == ['', 'spits',
+        u'\u00e7\u00e3o', '']
+    assert i.ReadInt() == 7
+
+def test_string_ends_at_the_first_nul():
+    # Same as spitz::istream, the rest is read as the next string
+    o = OStream()
+    o.WriteString(b'ab\0cd')
+    i = IStream(o.Data())
+    assert i.ReadString() == 'ab'
+    assert i.ReadString() == 'cd'
+    assert not i.HasData()
+
+def test_unterminated_string():
+    with pytest.raises(EOFError):
+        IStream(b'abc').ReadString()
+
+def test_read_past_the_end():
+    i = IStream(b'\0\0')
+    with pytest.raises(EOFError):
+        i.ReadInt()
+
+@pytest.mark.parametrize('size', [0, 1, 63, 64, 65, 1000, 70000, 200000])
+def test_find_nul_in_chunks(size):
+    # A view of part of a buffer cannot be searched directly, so the
+    # string is found by the chunked scan
+    s = b'x' * size
+    data = bytearray(b'\1' + s + b'\0' + b'tail\0' + b'\1')
+    i = IStream(memoryview(data)[1:-1])
+    assert i.searchable == None
+    assert i.ReadString() == s.decode('utf8')
+    assert i.ReadString() == 'tail'
+    assert not i.HasData()
+
+def test_find_nul_without_terminator_in_chunks():
+    data = bytearray(b'x' * 100000)
+    i = IStream(memoryview(data)[1:])
+    assert i.find_nul() == -1
+    with pytest.raises(EOFError):
+        i.ReadString()
+
+def test_searchable_views():
+    data = bytearray(b'abc\0')
+    assert IStream(bytes(data)).searchable != None
+    assert IStream(memoryview(data)).searchable is data
+    assert IStream(memoryview(data)).ReadString() == 'abc'
+
+def test_views_do_not_copy():
+    data = bytearray(b'\0\0\0\2xy')
+    i = IStream(data)
+    assert i.ReadInt() == 2
+    v = i.ReadView(2)
+    data[4:6] = b'zw'
+    assert v.tobytes() == b'zw'
+
+def test_arrays_round_trip():
+    o = OStream()
+    o.WriteArray('int', [1, -2, 3])
+    o.WriteArray('double', [0.5, 1.5])
+    o.WriteArray('bool', [True, False])
+    i = IStream(o.Data())
+    assert list(i.ReadArray('int', 3)) == [1, -2, 3]
+    assert list(i.ReadArray('double', 2)) == [0.5, 1.5]
+    assert list(i.ReadArray('bool', 2)) == [True, False]
+    assert not i.HasData()
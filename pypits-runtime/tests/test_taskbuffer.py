@@ -0,0 +1,60 @@
+import threading
+
+from libspitz import TaskBuffer
+
+def test_items_in_order():
+    b = TaskBuffer(4)
+    for i in range(3):
+        assert b.Put(i, 1)
+    assert [b.Get() for i in range(3)] == [0, 1, 2]
+
+def test_close_drains_before_the_end():
+    b = TaskBuffer(4)
+    b.Put('a', 1)
+    b.Put('b', 1)
+    b.Close()
+    assert b.Get() == 'a'
+    assert b.Get() == 'b'
+    assert b.Get() == None
+    assert b.error == None
+
+def test_put_after_close_is_refused():
+    b = TaskBuffer(4)
+    b.Close()
+    assert not b.Put('a', 1)
+    assert b.Get() == None
+
+def test_close_with_error():
+    b = TaskBuffer(4)
+    b.Put('a', 1)
+    b.Close('failed')
+    b.Close()
+    assert b.Get() == 'a'
+    assert b.Get() == None
+    assert b.error == 'failed'
+
+def test_budget_accepts_a_single_large_item():
+    b = TaskBuffer(4, 10)
+    assert b.Put('big', 100)
+    assert b.full(1)
+    assert b.Get() == 'big'
+    assert not b.full(1)
+
+def test_close_wakes_a_blocked_producer():
+    b = TaskBuffer(1)
+    b.Put('a', 1)
+    done = []
+    t = threading.Thread(target=lambda: done.append(b.Put('b', 1)))
+    t.start()
+    b.Close()
+    t.join(5)
+    assert done == [False]
+
+def test_get_waits_for_the_producer():
+    b = TaskBuffer(1)
+    got = []
+    t = threading.Thread(target=lambda: got.append(b.Get()))
+    t.start()
+    b.Put('a', 1)
+    t.join(5)
+    assert got == ['a']
@@ -23,12 +23,14 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS 
 # IN THE SOFTWARE.
 
-from libspitz import JobBinary, SimpleEndpoint
-from libspitz import Listener, TaskPool
-from libspitz import messaging, config
+from libspitz import JobBinary, JobModule, Job, SimpleEndpoint
+from libspitz import Listener, TaskPool, ResultQueue, Topology, DataCache
+from libspitz import ResultCache
+from libspitz import messaging, config, log
 
 import Args
-import sys, os, datetime, logging, multiprocessing, struct, time
+import sys, os, datetime, logging, multiprocessing, random, struct, time
+import threading
 import traceback
 
 try:
@@ -41,19 +43,73 @@ tm_mode = None # Addressing mode
 tm_addr = None # Bind address
 tm_port = None # Bind port
 tm_nw = None # Maximum number of workers
+tm_min_nw = None # Workers kept even when idle
+tm_idle_timeout = None # Seconds before an idle worker is retired
+tm_load_adapt = False # Leave the cpus used by other processes
+tm_deadline = None # Default seconds before a running task expires
 tm_overfill = 0 # Extra space in the task queue 
+tm_batch = None # Tasks run in a single call by the batching modules
 tm_announce = None # Mechanism used to broadcast TM address
+tm_jm_addr = None # Address of the job manager to register with
+tm_jm_port = None # Port of the job manager to register with
+tm_register_interval = None # Seconds between registrations
 tm_log_file = None # Output file for logging
+tm_log_level = None # Logging verbosity
+tm_log_sample = None # Log one of every n per-task messages
+tm_log_interval = None # Seconds between per-task log summaries
+tm_log_listener = None # Background thread writing the log
+tm_log_received = None # Sampled log of received tasks
+tm_log_processed = None # Sampled log of processed tasks
+tm_log_sent = None # Sampled log of sent results
 tm_conn_timeout = None # Socket connect timeout
 tm_recv_timeout = None # Socket receive timeout
 tm_send_timeout = None # Socket send timeout
+tm_result_budget = None # Memory budget for results not yet sent
+tm_spill_dir = None # Directory for results beyond the budget
+tm_affinity = None # Placement of the workers (none, core or numa)
+tm_numa_pools = False # Run a separate pool for each NUMA node
+tm_metrics_file = None # Output file for the per task metrics
+tm_data_dir = None # Directory caching the job data
+tm_result_cache_dir = None # Directory caching the task results
+tm_result_cache_size = None # Size limit of the result cache
+
+# Identifies this run of the task manager in the heartbeats, so the job
+# managers know when the tasks sent to it were lost in a restart
+tm_instance = random.getrandbits(62)
+
+# Output of the per task metrics shared by the pools
+tm_metrics = None
+tm_metrics_lock = threading.Lock()
+
+# Jobs running in this task manager, job 0 is the module given in the
+# command line, if any, the other jobs are sent by the job managers
+tm_jobs = {}
+tm_jobs_lock = threading.Lock()
+
+# Modules already loaded, indexed by the hash of their content
+tm_binaries = {}
+
+# Pools of workers, each with the result queues of its jobs
+tm_pools = []
+
+# Local disk cache of the job data and the modules
+tm_data_cache = None
+tm_data_lock = threading.Lock()
+
+# Pools registered with the job manager, as (address, workers, capabilities)
+tm_registrations = []
 
 ###############################################################################
 # Parse global configuration
 ###############################################################################
 def parse_global_config(argdict):
-    global tm_mode, tm_addr, tm_port, tm_nw, tm_log_file, tm_overfill, \
-        tm_announce, tm_conn_timeout, tm_recv_timeout, tm_send_timeout
+    global tm_mode, tm_addr, tm_port, tm_nw, tm_min_nw, tm_idle_timeout, \
+        tm_load_adapt, tm_deadline, tm_log_file, tm_overfill, tm_batch, \
+        tm_announce, tm_jm_addr, tm_jm_port, tm_register_interval, \
+        tm_conn_timeout, tm_recv_timeout, tm_send_timeout, \
+        tm_log_level, tm_log_sample, tm_log_interval, tm_result_budget, \
+        tm_spill_dir, tm_affinity, tm_numa_pools, tm_metrics_file, \
+        tm_data_dir, tm_result_cache_dir, tm_result_cache_size
 
     def as_int(v):
         if v == None:
@@ -71,35 +127,89 @@ def parse_global_config(argdict):
     tm_nw = int(argdict.get('nw', multiprocessing.cpu_count()))
     if tm_nw <= 0:
         tm_nw = multiprocessing.cpu_count()
+    tm_min_nw = min(max(int(argdict.get('minnw', 0)), 0), tm_nw)
+    tm_idle_timeout = float(argdict.get('idle', config.worker_idle_timeout))
+    if tm_idle_timeout <= 0:
+        tm_idle_timeout = None
+    tm_load_adapt = int(argdict.get('loadadapt', 0)) != 0
+    tm_deadline = argdict.get('deadline', config.task_deadline)
+    if tm_deadline != None:
+        tm_deadline = float(tm_deadline)
+        if tm_deadline <= 0:
+            tm_deadline = None
     tm_overfill = max(int(argdict.get('overfill', 0)), 0)
+    tm_batch = max(int(argdict.get('batch', config.worker_batch)), 1)
     tm_announce = argdict.get('announce', 'none')
+    tm_jm_addr = argdict.get('jmaddr', 'localhost')
+    tm_jm_port = int(argdict.get('jmport', config.spitz_jm_port))
+    tm_register_interval = max(float(argdict.get('reginterval',
+        config.register_interval)), 1)
     tm_log_file = argdict.get('log', None)
+    tm_log_level = log.parse_level(argdict.get('loglevel', config.log_level))
+    tm_log_sample = int(argdict.get('logsample', config.log_sample))
+    tm_log_interval = float(argdict.get('loginterval', config.log_interval))
     tm_conn_timeout = as_float(argdict.get('ctimeout', config.conn_timeout))
     tm_recv_timeout = as_float(argdict.get('rtimeout', config.recv_timeout))
     tm_send_timeout = as_float(argdict.get('stimeout', config.send_timeout))
+    tm_result_budget = as_int(argdict.get('rbudget', config.result_budget))
+    tm_spill_dir = argdict.get('spilldir', config.spill_dir)
+
+    # Payloads over the threshold are mapped files in the spill directory,
+    # a threshold of 0 keeps them all in memory
+    config.spill_dir = tm_spill_dir
+    large = int(argdict.get('largepayload', config.large_payload or 0))
+    config.large_payload = large if large > 0 else None
+    config.large_chunk = max(int(argdict.get('largechunk',
+        config.large_chunk)), 1)
+    tm_affinity = argdict.get('affinity', config.affinity_none)
+    tm_numa_pools = int(argdict.get('numapools', 0)) != 0
+    tm_metrics_file = argdict.get('metrics', None)
+    tm_data_dir = argdict.get('cachedir', config.data_cache_dir)
+    tm_result_cache_dir = argdict.get('rcache', None)
+    tm_result_cache_size = as_int(argdict.get('rcachesize',
+        config.result_cache_size))
 
 ###############################################################################
 # Configure the log output format
 ###############################################################################
 def setup_log():
+    global tm_log_listener, tm_log_received, tm_log_processed, tm_log_sent
     root = logging.getLogger()
-    root.setLevel(logging.DEBUG)
+    root.setLevel(tm_log_level)
     root.handlers = []
     if tm_log_file == None:
         ch = logging.StreamHandler(sys.stderr)
     else:
         ch = logging.StreamHandler(open(tm_log_file, 'wt'))
-    ch.setLevel(logging.DEBUG)
+    ch.setLevel(tm_log_level)
     formatter = logging.Formatter('%(asctime)s - %(threadName)s - '+
         '%(levelname)s - %(message)s')
     ch.setFormatter(formatter)
-    root.addHandler(ch)
+    tm_log_listener = log.start_async(root, ch)
+
+    # Per-task messages are sampled and summarized
+    tm_log_received = log.Sampler('tasks received',
+        tm_log_sample, tm_log_interval)
+    tm_log_processed = log.Sampler('tasks processed',
+        tm_log_sample, tm_log_interval)
+    tm_log_sent = log.Sampler('results sent',
+        tm_log_sample, tm_log_interval)
+
+###############################################################################
+# Flush the log before leaving
+###############################################################################
+def finish_log():
+    for s in (tm_log_received, tm_log_processed, tm_log_sent):
+        if s != None:
+            s.Flush()
+    log.stop_async(tm_log_listener)
 
 ###############################################################################
 # Abort the aplication with message
 ###############################################################################
 def abort(error):
     logging.critical(error)
+    finish_log()
     exit(1)
     
 ###############################################################################
@@ -120,43 +230,149 @@ def announce_cat(addr, filename = None):
     except:
         logging.warning('Failed to write to %s!' % (nodefile,))
 
+###############################################################################
+# Register a pool with the job manager
+###############################################################################
+def announce_register(addr, nw, caps):
+    jm = SimpleEndpoint(tm_jm_addr, tm_jm_port)
+    jm.Open(tm_conn_timeout)
+    try:
+        jm.WriteInt64(messaging.msg_register)
+        jm.WriteString(addr)
+        jm.WriteInt64(nw)
+        jm.WriteInt64(len(caps))
+        for cap in caps:
+            jm.WriteString(cap)
+        # Wait for the job manager to store it
+        jm.ReadInt64(tm_recv_timeout)
+    finally:
+        jm.Close()
+
+###############################################################################
+# Remove the pools from the job manager
+###############################################################################
+def announce_deregister():
+    for addr, nw, caps in tm_registrations:
+        try:
+            jm = SimpleEndpoint(tm_jm_addr, tm_jm_port)
+            jm.Open(tm_conn_timeout)
+            jm.WriteInt64(messaging.msg_deregister)
+            jm.WriteString(addr)
+            jm.Close()
+        except:
+            logging.debug('Could not deregister %s from %s:%d.',
+                addr, tm_jm_addr, tm_jm_port)
+
+###############################################################################
+# Registration routine, registers again periodically so a job manager
+# started later or restarted also learns about the task manager
+###############################################################################
+def register_loop():
+    registered = False
+    while True:
+        try:
+            for addr, nw, caps in tm_registrations:
+                announce_register(addr, nw, caps)
+            if not registered:
+                logging.info('Registered with the job manager at %s:%d.',
+                    tm_jm_addr, tm_jm_port)
+            registered = True
+        except:
+            if registered:
+                logging.info('Lost the job manager at %s:%d.',
+                    tm_jm_addr, tm_jm_port)
+            else:
+                logging.debug('No job manager at %s:%d yet.',
+                    tm_jm_addr, tm_jm_port)
+            registered = False
+        time.sleep(tm_register_interval)
+
 ###############################################################################
 # Server callback
 ###############################################################################
-def server_callback(conn, addr, port, job, tpool, cqueue):
+def server_callback(conn, addr, port, tpool, results):
     logging.info('Connected to %s:%d.', addr, port)
 
     try:
-        # Read the type of message
+        # Read the type of message, messages not selecting
+        # a job are for job 0
+        jobid = 0
         mtype = conn.ReadInt64(tm_recv_timeout)
+        if mtype == messaging.msg_select_job:
+            jobid = conn.ReadInt64(tm_recv_timeout)
+            mtype = conn.ReadInt64(tm_recv_timeout)
+        job = tm_jobs.get(jobid, None)
 
         # Termination signal
         if mtype == messaging.msg_terminate:
             logging.info('Received a kill signal from %s:%d.',
                 addr, port)
+            if tm_metrics != None:
+                with tm_metrics_lock:
+                    tm_metrics.flush()
+            for job in list(tm_jobs.values()):
+                log_result_cache(job)
+            announce_deregister()
+            finish_log()
             os._exit(0)
 
+        # Job manager is checking if the task manager is alive
+        elif mtype == messaging.msg_heartbeat:
+            conn.WriteInt64(tm_instance)
+
+        # Job manager is starting a job
+        elif mtype == messaging.msg_send_job:
+            receive_job(conn, addr, port, jobid)
+
+        # Job manager finished a job
+        elif mtype == messaging.msg_end_job:
+            logging.info('Job %d finished by %s:%d.', jobid, addr, port)
+            end_job(jobid)
+
+        # The job must be sent before its tasks
+        elif job == None:
+            logging.info('Job %d is not running here.', jobid)
+            if mtype == messaging.msg_send_task:
+                conn.WriteInt64(messaging.msg_unknown_job)
+            elif mtype == messaging.msg_read_result:
+                conn.WriteInt64(0)
+
+        # Workers cannot start without the job data, ask for it
+        # instead of accepting tasks
+        elif mtype == messaging.msg_send_task and job.NeedsData():
+            logging.info('Requesting the data of job %d from %s:%d...',
+                jobid, addr, port)
+            conn.WriteInt64(messaging.msg_need_data)
+
         # Job manager is trying to send tasks to the task manager
-        if mtype == messaging.msg_send_task:
-            torecv = tpool.Free()
-            logging.info('Capable of receiving %d tasks...', torecv)
-            conn.WriteInt64(torecv)
-            for i in range(torecv):
-                taskid = conn.ReadInt64(tm_recv_timeout)
-                tasksz = conn.ReadInt64(tm_recv_timeout)
-                task = conn.Read(tasksz, tm_recv_timeout)
-                logging.info('Received task %d from %s:%d.',
-                    taskid, addr, port)
-
-                # Try enqueue the received task
-                if not tpool.Put(taskid, task):
-                    # For some reason the pool got full in between
-                    logging.warning('Ignoring just received task %d because ' +
-                        'the pool is full! (Should not happen)', taskid)
+        elif mtype == messaging.msg_send_task:
+            cqueue = job_results(results, job)
+
+            # The slots offered are reserved until the tasks arrive, so
+            # other connections are not offered the same slots
+            torecv = tpool.Reserve()
+            try:
+                logging.info('Capable of receiving %d tasks...', torecv)
+                conn.WriteInt64(torecv)
+                while torecv > 0:
+                    taskid = conn.ReadInt64(tm_recv_timeout)
+                    priority = conn.ReadInt64(tm_recv_timeout)
+                    tasksz = conn.ReadInt64(tm_recv_timeout)
+                    task = conn.ReadPayload(tasksz, tm_recv_timeout)
+                    tm_log_received.Log(logging.DEBUG,
+                        'Received task %d from %s:%d.', taskid, addr, port)
+
+                    # Enqueue the received task in a reserved slot
+                    tpool.Put(taskid, (job, cqueue, task), job=job,
+                        priority=priority, reserved=True)
+                    torecv -= 1
+            finally:
+                tpool.Release(torecv)
 
         # Job manager is querying the results of the completed tasks
         elif mtype == messaging.msg_read_result:
-            tosend = cqueue.qsize()
+            cqueue = results.get(job, None)
+            tosend = 0 if cqueue == None else cqueue.qsize()
             conn.WriteInt64(tosend)
             taskid = None
             try:
@@ -166,7 +382,8 @@ def server_callback(conn, addr, port, job, tpool, cqueue):
                     # Pop the task
                     taskid, r, res = cqueue.get_nowait()
 
-                    logging.info('Sending task %d to committer %s:%d...',
+                    tm_log_sent.Log(logging.DEBUG,
+                        'Sending task %d to committer %s:%d...',
                         taskid, addr, port)
 
                     # Send the task
@@ -176,7 +393,7 @@ def server_callback(conn, addr, port, job, tpool, cqueue):
                         conn.WriteInt64(0)
                     else:
                         conn.WriteInt64(len(res))
-                        conn.Write(res)
+                        conn.WritePayload(res)
 
                     taskid = None
 
@@ -191,6 +408,19 @@ def server_callback(conn, addr, port, job, tpool, cqueue):
                     logging.info('Task %d put back in the queue.', taskid)
                 pass
 
+        # Job manager is broadcasting the job data
+        elif mtype == messaging.msg_send_data:
+            receive_data(conn, addr, port, job)
+
+        # Job manager is cancelling tasks already committed elsewhere
+        elif mtype == messaging.msg_cancel_task:
+            ncancel = conn.ReadInt64(tm_recv_timeout)
+            taskids = [conn.ReadInt64(tm_recv_timeout)
+                for i in range(ncancel)]
+            n = tpool.Cancel(taskids, job)
+            logging.info('Cancelled %d of %d tasks requested by %s:%d.',
+                n, ncancel, addr, port)
+
         # Unknow message received or a wrong sized packet could be trashing
         # the buffer, don't do anything
         else:
@@ -211,23 +441,274 @@ def server_callback(conn, addr, port, job, tpool, cqueue):
     conn.Close()
     logging.info('Connection to %s:%d closed.', addr, port)
 
+###############################################################################
+# Receive the job data, or use the cached copy
+###############################################################################
+def receive_data(conn, addr, port, job):
+    digest = conn.ReadString(tm_recv_timeout)
+    size = conn.ReadInt64(tm_recv_timeout)
+
+    with tm_data_lock:
+        if tm_data_cache.Has(digest):
+            logging.info('Job data %s found in the cache.', digest)
+            conn.WriteInt64(0)
+        else:
+            logging.info('Receiving %d bytes of job data from %s:%d...',
+                size, addr, port)
+            conn.WriteInt64(1)
+            data = conn.ReadPayload(size, tm_recv_timeout)
+            tm_data_cache.Store(digest, data)
+
+        if job.NeedsData():
+            job.SetData(digest, tm_data_cache.Map(digest))
+
+    conn.WriteInt64(1)
+
+###############################################################################
+# Receive a job from a job manager
+###############################################################################
+def receive_job(conn, addr, port, jobid):
+    filename = conn.ReadString(tm_recv_timeout)
+    argc = conn.ReadInt64(tm_recv_timeout)
+    argv = [conn.ReadString(tm_recv_timeout) for i in range(argc)]
+    deadline = conn.ReadInt64(tm_recv_timeout)
+    deadline = deadline / 1000.0 if deadline > 0 else None
+    digest = conn.ReadString(tm_recv_timeout)
+
+    logging.info('Received job %d from %s:%d.', jobid, addr, port)
+
+    # A module already loaded here, such as the one in the command
+    # line, is reused even if the path of the job manager is not
+    # reachable
+    with tm_jobs_lock:
+        binary = tm_binaries.get(digest, None)
+    if binary != None:
+        start_job(jobid, binary, argv, deadline)
+        conn.WriteInt64(1)
+        return
+
+    try:
+        binary = load_binary(filename)
+    except:
+        logging.error('Could not load the module %s of job %d!',
+            filename, jobid)
+        conn.WriteInt64(0)
+        return
+
+    start_job(jobid, binary, argv, deadline)
+    conn.WriteInt64(1)
+
+###############################################################################
+# Load a module, or reuse it if it was already loaded
+###############################################################################
+def load_binary(filename):
+    with open(filename, 'rb') as f:
+        data = f.read()
+    digest = DataCache.digest(data)
+
+    # Modules are loaded from a copy named by their hash, so a module
+    # rebuilt in place is loaded again and an unchanged one is reused
+    with tm_jobs_lock:
+        binary = tm_binaries.get(digest, None)
+        if binary == None:
+            with tm_data_lock:
+                if not tm_data_cache.Has(digest):
+                    tm_data_cache.Store(digest, data)
+            logging.info('Loading module %s (%s)...', filename, digest)
+            if JobModule.is_python(filename):
+                binary = JobModule(tm_data_cache.path(digest))
+            else:
+                binary = JobBinary(tm_data_cache.path(digest))
+            tm_binaries[digest] = binary
+    return binary
+
+###############################################################################
+# Start a job, replacing a different job with the same id
+###############################################################################
+def start_job(jobid, binary, argv, deadline = None):
+    with tm_jobs_lock:
+        old = tm_jobs.get(jobid, None)
+        if old != None and old.Matches(binary, argv):
+            old.deadline = deadline
+            return
+        tm_jobs[jobid] = Job(jobid, binary, argv, deadline)
+
+    if old != None:
+        logging.info('Replacing job %d...', jobid)
+        stop_job(old)
+    logging.info('Job %d started.', jobid)
+
+###############################################################################
+# End a job and discard its queued tasks
+###############################################################################
+def end_job(jobid):
+    with tm_jobs_lock:
+        job = tm_jobs.pop(jobid, None)
+    if job != None:
+        stop_job(job)
+
+def stop_job(job):
+    # The workers finalize their states of the job when they are
+    # done with the running tasks, the idle ones right away
+    job.End()
+    n = 0
+    for tpool, results in tm_pools:
+        n += tpool.Drop(job)
+        tpool.Wake()
+        with tm_jobs_lock:
+            results.pop(job, None)
+    log_result_cache(job)
+    logging.info('Job %d ended, %d queued tasks dropped.', job.jobid, n)
+
+###############################################################################
+# Get the result queue of a job in a pool
+###############################################################################
+def job_results(results, job):
+    with tm_jobs_lock:
+        cqueue = results.get(job, None)
+        if cqueue == None:
+            cqueue = ResultQueue(tm_result_budget, tm_spill_dir)
+            results[job] = cqueue
+        return cqueue
+
+###############################################################################
+# Create the routine throttling a pool while any of its jobs is spilling
+# results to disk
+###############################################################################
+def results_throttle(results):
+    def throttle():
+        with tm_jobs_lock:
+            cqueues = list(results.values())
+        return any(cqueue.OverBudget() for cqueue in cqueues)
+
+    return throttle
+
+###############################################################################
+# Deadline of the tasks of a job, the job managers may override the default
+###############################################################################
+def job_deadline(job):
+    return job.deadline if job.deadline != None else tm_deadline
+
+###############################################################################
+# Report a task past its deadline, the job manager reschedules it
+###############################################################################
+def report_expired(job, taskid, item):
+    job, cqueue, task = item
+    cqueue.put((taskid, messaging.res_module_timeout, None))
+
+###############################################################################
+# Open the result cache of a job, once its data is known
+###############################################################################
+def open_result_cache(job):
+    # Only the modules marking their tasks as cacheable use it
+    if tm_result_cache_dir == None or \
+        not job.binary.has_entry('spits_task_cacheable'):
+        return
+    with job.lock:
+        if job.cache == None:
+            job.cache = ResultCache(tm_result_cache_dir,
+                tm_result_cache_size, ResultCache.scope(job.binary.filename,
+                job.argv, job.digest))
+            logging.info('Using the result cache at %s for job %d.',
+                tm_result_cache_dir, job.jobid)
+
+def log_result_cache(job):
+    if job.cache != None:
+        logging.info('Result cache of job %d: %d hits, %d misses, ' +
+            '%d entries, %d bytes.', job.jobid, *job.cache.Stats())
+
 ###############################################################################
 # Initializer routine for the worker
 ###############################################################################
-def initializer(cqueue, job, argv):
-    logging.info('Initializing worker...')
-    return job.spits_worker_new(argv)
+def initializer():
+    # The states of the module workers, created on the first task of
+    # each job
+    return {}
+
+###############################################################################
+# Create the state of the module worker for a job
+###############################################################################
+def new_worker(job):
+    logging.info('Initializing worker for job %d...', job.jobid)
+    binary = job.binary
+    job.WaitData()
+    open_result_cache(job)
+    if binary.has_entry('spits_worker_new_with_data'):
+        return binary.spits_worker_new_with_data(job.argv, job.data)
+    return binary.spits_worker_new(job.argv)
 
 ###############################################################################
 # Worker routine
 ###############################################################################
-def worker(state, taskid, task, cqueue, job, argv):
-    logging.info('Processing task %d...', taskid)
+def worker(states, taskid, item):
+    job, cqueue, task = item
+    state = worker_state(states, job)
+
+    # Reuse the result of an identical task
+    key = None
+    if job.cache != None and job.binary.spits_task_cacheable(task):
+        key = job.cache.Key(task)
+        if cached(job, cqueue, taskid, key):
+            return
 
     # Execute the task using the job module
-    r, res, ctx = job.spits_worker_run(state, task, taskid)
+    r, res, ctx = job.binary.spits_worker_run(state, task, taskid)
+    enqueue(job, cqueue, taskid, key, r, res, ctx)
+
+###############################################################################
+# Worker routine for a batch of tasks of the same job
+###############################################################################
+def batch_worker(states, items):
+    job, cqueue = items[0][1][0], items[0][1][1]
+    state = worker_state(states, job)
+
+    # Reuse the results of identical tasks
+    taskids, tasks, keys = [], [], []
+    for taskid, (job, cqueue, task) in items:
+        key = None
+        if job.cache != None and job.binary.spits_task_cacheable(task):
+            key = job.cache.Key(task)
+            if cached(job, cqueue, taskid, key):
+                continue
+        taskids.append(taskid)
+        tasks.append(task)
+        keys.append(key)
+    if len(tasks) == 0:
+        return
+
+    # Execute the tasks in a single call to the job module
+    results = job.binary.spits_worker_run_batch(state, tasks, taskids)
+    for taskid, key, (r, res, ctx) in zip(taskids, keys, results):
+        enqueue(job, cqueue, taskid, key, r, res, ctx)
 
-    logging.info('Task %d processed.', taskid)
+###############################################################################
+# Get the state of the module worker for a job
+###############################################################################
+def worker_state(states, job):
+    release_workers(states)
+    state = states.get(job, None)
+    if state == None:
+        state = new_worker(job)
+        states[job] = state
+    return state
+
+###############################################################################
+# Enqueue the cached result of a task, if any
+###############################################################################
+def cached(job, cqueue, taskid, key):
+    res = job.cache.Get(key)
+    if res == None:
+        return False
+    tm_log_processed.Log(logging.DEBUG,
+        'Task %d found in the result cache.', taskid)
+    cqueue.put((taskid, 0, res))
+    return True
+
+###############################################################################
+# Validate and enqueue the result of a task
+###############################################################################
+def enqueue(job, cqueue, taskid, key, r, res, ctx):
+    tm_log_processed.Log(logging.DEBUG, 'Task %d processed.', taskid)
 
     if res == None:
         logging.error('Task %d did not push any result!', taskid)
@@ -237,45 +718,149 @@ def worker(state, taskid, task, cqueue, job, argv):
         logging.error('Context verification failed for task %d!', taskid)
         return
 
+    # Only successful results are reused
+    if key != None and r == 0:
+        job.cache.Put(key, res[0])
+
     # Enqueue the result
     cqueue.put((taskid, r, res[0]))
 
 ###############################################################################
-# Run routine
+# Only the modules running batches natively get more than a task per call
 ###############################################################################
-def run(argv, job):
-    # Create a work pool and a commit queue
-    cqueue = queue.Queue()
-    tpool = TaskPool(tm_nw, tm_overfill, initializer, 
-        worker, (cqueue, job, argv))
+def batchable(job):
+    return job.binary.has_entry('spits_worker_run_batch')
 
-    # Create the server
-    logging.info('Starting network listener...')
-    l = Listener(tm_mode, tm_addr, tm_port, 
-        server_callback, (job, tpool, cqueue))
-        
+###############################################################################
+# Release the workers of the jobs already finished, also run by the idle
+# workers when a job ends
+###############################################################################
+def release_workers(states):
+    for ended in [j for j in states if j.ended]:
+        finalize_worker(ended, states.pop(ended))
+
+###############################################################################
+# Finalizer routine for the worker
+###############################################################################
+def finalizer(states):
+    for job, state in states.items():
+        finalize_worker(job, state)
+
+def finalize_worker(job, state):
+    logging.info('Finalizing worker for job %d...', job.jobid)
+    job.binary.spits_worker_finalize(state)
+
+###############################################################################
+# Create the routine recording which worker ran each task
+###############################################################################
+def metrics_recorder(pool):
+    if tm_metrics_file == None:
+        return None
+
+    def record(taskid, worker, cpus, start, end):
+        cpulist = 'any' if cpus == None else Topology.format_cpulist(cpus)
+        with tm_metrics_lock:
+            tm_metrics.write('%d,%s,%d,%s,%.6f,%.6f\n' % (taskid, pool,
+                worker, cpulist, start, end))
+
+    return record
+
+###############################################################################
+# Run routine
+###############################################################################
+def run():
+    # Split the workers in one pool per NUMA node, or a single pool
+    # for the whole host
+    topology = Topology()
+    if tm_numa_pools:
+        pools = topology.Nodes()
+    else:
+        pools = [(None, topology.cpus)]
+
+    listeners = []
+    for i, (node, cpus) in enumerate(pools):
+        if node == None:
+            name = 'all'
+            nw = tm_nw
+            placement = topology.Placement(tm_affinity)
+        else:
+            name = 'node%d' % node
+            nw = max(tm_nw * len(cpus) // len(topology.cpus), 1)
+            # Workers in a NUMA pool never leave their node
+            placement = topology.Placement(tm_affinity
+                if tm_affinity != config.affinity_none
+                else config.affinity_numa, cpus)
+
+        logging.info('Starting pool %s with %d workers on cpus %s...',
+            name, nw, Topology.format_cpulist(cpus))
+
+        # Create a work pool shared by the jobs and their commit queues,
+        # the pool stops accepting tasks while the results are spilling
+        # to disk
+        results = {}
+        tpool = TaskPool(nw, tm_overfill, initializer, worker, (),
+            finalizer, throttle = results_throttle(results),
+            placement = placement, metrics = metrics_recorder(name),
+            tidy = release_workers,
+            min_threads = min(tm_min_nw, nw), idle_timeout = tm_idle_timeout,
+            load_adapt = tm_load_adapt, deadline = job_deadline,
+            expired = report_expired, batch = tm_batch,
+            batch_worker = batch_worker, batchable = batchable)
+        tm_pools.append((tpool, results))
+
+        # Create the server, each pool is seen as a separate
+        # task manager by the job manager
+        logging.info('Starting network listener...')
+        if tm_mode == config.mode_tcp:
+            addr = tm_addr
+            port = tm_port + i if tm_port != 0 else 0
+        else:
+            addr = tm_addr if i == 0 else '%s.%d' % (tm_addr, i)
+            port = tm_port
+        l = Listener(tm_mode, addr, port, 
+            server_callback, (tpool, results))
         
-    # Start the server^M
-    l.Start()
+        # Start the server
+        l.Start()
     
-    # Announce the worker
-    logging.info('ANNOUNCE %s' % l.GetConnectableAddr())
+        # Announce the worker
+        logging.info('ANNOUNCE %s' % l.GetConnectableAddr())
     
-    if tm_announce == config.announce_cat_nodes:
-        announce_cat(l.GetConnectableAddr())
-
-    # Wait for work^M
+        if tm_announce == config.announce_cat_nodes:
+            announce_cat(l.GetConnectableAddr())
+        elif tm_announce == config.announce_register:
+            if tm_mode == config.mode_tcp:
+                tm_registrations.append((l.GetConnectableAddr(), nw,
+                    ['pool=%s' % name,
+                     'cpus=%s' % Topology.format_cpulist(cpus),
+                     'affinity=%s' % tm_affinity]))
+            else:
+                logging.warning('Only tcp task managers can register!')
+
+        listeners.append(l)
+
+    # Keep the pools registered with the job manager
+    if len(tm_registrations) > 0:
+        t = threading.Thread(target=register_loop)
+        t.daemon = True
+        t.start()
+
+    # Wait for work
     logging.info('Waiting for work...')
-    l.Join()
+    try:
+        for l in listeners:
+            l.Join()
+    except KeyboardInterrupt:
+        logging.info('Interrupted, leaving...')
+        for l in listeners:
+            l.Stop()
+    finally:
+        announce_deregister()
 
 ###############################################################################
 # Main routine
 ###############################################################################
 def main(argv):
-    # Print usage
-    if len(argv) <= 1:
-        abort('USAGE: tm [args] module [module args]')
-
     # Parse the arguments
     args = Args.Args(argv)
     parse_global_config(args.args)
@@ -284,18 +869,28 @@ def main(argv):
     setup_log()
     logging.debug('Hello!')
 
-    # Load the module
-    module = args.margs[0]
-    job = JobBinary(module)
+    # Open the job data cache
+    global tm_data_cache
+    tm_data_cache = DataCache(tm_data_dir)
+
+    # The module in the command line, if any, runs as job 0, removing
+    # the TM arguments when passing to the module
+    if len(args.margs) > 0:
+        margv = args.margs
+        start_job(0, load_binary(margv[0]), margv)
 
-    # Remove JM arguments when passing to the module
-    margv = args.margs
+    # Open the metrics output
+    global tm_metrics
+    if tm_metrics_file != None:
+        tm_metrics = open(tm_metrics_file, 'wt')
+        tm_metrics.write('taskid,pool,worker,cpus,start,end\n')
 
     # Start the tm
-    run(margv, job)
+    run()
 
     # Finalize
     logging.debug('Bye!')
+    finish_log()
     #exit(r)
 
 ###############################################################################
@@ -0,0 +1,200 @@
+/*
+ * The MIT License (MIT)
+ *
+ * Copyright (c) 2015 Caian Benedicto <caian@ggaunicamp.com>
+ * Copyright (c) 2014 Ian Liu Rodrigues <ian.liu@ggaunicamp.com>
+ *
+ * Permission is hereby granted, free of charge, to any person obtaining a copy 
+ * of this software and associated documentation files (the "Software"), to 
+ * deal in the Software without restriction, including without limitation the 
+ * rights to use, copy, modify, merge, publish, distribute, sublicense, 
+ * and/or sell copies of the Software, and to permit persons to whom the 
+ * Software is furnished to do so, subject to the following conditions:
+ * 
+ * The above copyright notice and this permission notice shall be included in 
+ * all copies or substantial portions of the Software.
+ * 
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR 
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL 
+ * THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER 
+ * LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING 
+ * FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS 
+ * IN THE SOFTWARE.
+ */
+
+/*
+ * Compares the per element and the bulk array serialization of the
+ * spitz streams, and the decoding of strings and blobs.
+ *
+ * Build and run with:
+ *
+ *   g++ -O2 -I../include stream.cpp -o stream && ./stream [n]
+ */
+
+#include "stream.hpp"
+
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+#include <sstream>
+#include <string>
+#include <vector>
+#include <sys/time.h>
+
+static double now()
+{
+    struct timeval tv;
+    gettimeofday(&tv, NULL);
+    return tv.tv_sec + tv.tv_usec * 1e-6;
+}
+
+static void report(const char *name, double t, size_t bytes)
+{
+    printf("%-28s %9.3f ms %9.1f MB/s\n", name, t * 1e3,
+        bytes / t / (1024.0 * 1024.0));
+}
+
+template<typename T> static void bench(const char *type, size_t n)
+{
+    std::vector<T> v(n), w(n);
+    for (size_t i = 0; i < n; i++)
+        v[i] = (T)(i * 3 + 1);
+    size_t bytes = n * sizeof(T);
+    char name[64];
+    double t;
+
+    // Per element
+    spitz::ostream o1;
+    t = now();
+    for (size_t i = 0; i < n; i++)
+        o1 << v[i];
+    t = now() - t;
+    snprintf(name, sizeof(name), "write %s x%zu", type, n);
+    report(name, t, bytes);
+
+    // Bulk, with the memory reserved
+    spitz::ostream o2;
+    t = now();
+    o2.reserve(bytes);
+    o2.write_array(v);
+    t = now() - t;
+    snprintf(name, sizeof(name), "write_array %s", type);
+    report(name, t, bytes);
+
+    if (o1.pos() != o2.pos() || memcmp(o1.data(), o2.data(), bytes) != 0) {
+        fprintf(stderr, "The %s streams differ!\n", type);
+        exit(1);
+    }
+
+    // Per element
+    spitz::istream i1(o1.data(), o1.pos());
+    t = now();
+    for (size_t i = 0; i < n; i++)
+        i1 >> w[i];
+    t = now() - t;
+    snprintf(name, sizeof(name), "read %s x%zu", type, n);
+    report(name, t, bytes);
+
+    // Bulk
+    std::vector<T> u(n);
+    spitz::istream i2(o2.data(), o2.pos());
+    t = now();
+    i2.read_array(u);
+    t = now() - t;
+    snprintf(name, sizeof(name), "read_array %s", type);
+    report(name, t, bytes);
+
+    if (v != w || v != u) {
+        fprintf(stderr, "The %s values differ!\n", type);
+        exit(1);
+    }
+}
+
+static void bench_strings(size_t n)
+{
+    std::string s("a string of some 32 characters.");
+    size_t bytes = n * (s.size() + 1);
+    double t;
+
+    spitz::ostream o;
+    t = now();
+    for (size_t i = 0; i < n; i++)
+        o << s;
+    t = now() - t;
+    report("write_string", t, bytes);
+
+    // Character by character, as read_string used to
+    spitz::istream i1(o.data(), o.pos());
+    size_t total = 0;
+    t = now();
+    for (size_t i = 0; i < n; i++) {
+        std::stringstream ss;
+        char c;
+        while ((c = i1.read_char()))
+            ss << c;
+        total += ss.str().size();
+    }
+    t = now() - t;
+    report("read_char loop", t, bytes);
+
+    spitz::istream i2(o.data(), o.pos());
+    t = now();
+    for (size_t i = 0; i < n; i++)
+        total -= i2.read_string().size();
+    t = now() - t;
+    report("read_string", t, bytes);
+
+    if (total != 0) {
+        fprintf(stderr, "The strings differ!\n");
+        exit(1);
+    }
+}
+
+static void bench_blobs(size_t n, size_t size)
+{
+    std::vector<uint8_t> blob(size, 7), copy(size);
+    spitz::ostream o;
+    o.reserve(n * size);
+    for (size_t i = 0; i < n; i++)
+        o.write_data(blob.data(), size);
+    size_t bytes = n * size;
+    unsigned sum = 0;
+    double t;
+
+    spitz::istream i1(o.data(), o.pos());
+    t = now();
+    for (size_t i = 0; i < n; i++) {
+        i1.read_data(copy.data(), size);
+        sum += copy[size - 1];
+    }
+    t = now() - t;
+    report("read_data blobs", t, bytes);
+
+    spitz::istream i2(o.data(), o.pos());
+    t = now();
+    for (size_t i = 0; i < n; i++)
+        sum -= reinterpret_cast<const uint8_t*>(i2.read_view(size))[size - 1];
+    t = now() - t;
+    report("read_view blobs", t, bytes);
+
+    if (sum != 0) {
+        fprintf(stderr, "The blobs differ!\n");
+        exit(1);
+    }
+}
+
+int main(int argc, char *argv[])
+{
+    size_t n = argc > 1 ? atol(argv[1]) : 10000000;
+
+    bench<double>("double", n);
+    bench<float>("float", n);
+    bench<int64_t>("int64_t", n);
+    bench<int32_t>("int32_t", n);
+    bench<int16_t>("int16_t", n);
+    bench<uint8_t>("uint8_t", n);
+    bench_strings(n / 10);
+    bench_blobs(n / 10000, 64 * 1024);
+    return 0;
+}
@@ -61,14 +61,36 @@ int spits_job_manager_next_task(void *user_data,
 
 void spits_job_manager_finalize(void *user_data);
 
+/* Optional, the priority of a task generated by the job manager. Tasks 
+   with lower values are executed first, the default is the task id so 
+   the oldest tasks are executed first */
+
+long long int spits_job_manager_task_priority(void *user_data,
+    const void* task, spitssize_t tasksz, long long int taskid);
+
 /* Worker */
 
 void* spits_worker_new(int argc, const char *argv[]);
 
+/* Optional, replaces spits_worker_new when present. The data is the job 
+   information broadcast by the job manager, it is read-only and remains 
+   valid until the worker is finalized */
+
+void* spits_worker_new_with_data(int argc, const char *argv[],
+    const void* data, spitssize_t datasz);
+
 int spits_worker_run(void *user_data, const void* task, 
     spitssize_t tasksz, spitspush_t push_result, 
     spitsctx_t taskctx);
 
+/* Optional, runs count tasks at once. The result of each task must be 
+   pushed with the context of the task, taskctx[i], and its return code 
+   stored in rets[i]. A non-zero return marks all of them as failed */
+
+int spits_worker_run_batch(void *user_data, spitssize_t count,
+    const void* const tasks[], const spitssize_t tasksz[],
+    spitspush_t push_result, const spitsctx_t taskctx[], int rets[]);
+
 void spits_worker_finalize(void *user_data);
 
 /* Committer */
@@ -79,11 +101,26 @@ void* spits_committer_new(int argc, const char *argv[],
 int spits_committer_commit_pit(void *user_data,
     const void* result, spitssize_t resultsz);
 
+/* Optional, commits count results at once, in the same order they would 
+   be passed to spits_committer_commit_pit. A non-zero return marks all 
+   of them as failed */
+
+int spits_committer_commit_pits(void *user_data, spitssize_t count,
+    const void* const results[], const spitssize_t resultsz[]);
+
 int spits_committer_commit_job(void *user_data,
     spitspush_t push_final_result, spitsctx_t jobctx);
 
 void spits_committer_finalize(void *user_data);
 
+/* Result cache */
+
+/* Optional, non-zero if the result of the task depends only on the task, 
+   the module, its arguments and the job data. Only the results of these 
+   tasks are cached, none are when the function is missing */
+
+int spits_task_cacheable(const void* task, spitssize_t tasksz);
+
 #ifdef __cplusplus
 }
 #endif
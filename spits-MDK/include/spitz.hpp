@@ -111,6 +111,9 @@ namespace spitz {
     {
     public:
         virtual bool next_task(const pusher& task) = 0;
+        virtual int64_t task_priority(istream&, int64_t taskid) {
+            return taskid;
+        }
         virtual ~job_manager() { }
     };
 
@@ -118,6 +121,13 @@ namespace spitz {
     {
     public:
         virtual int run(istream& task, const pusher& result) = 0;
+        // Runs a batch of tasks, one at a time unless specialized, the
+        // result of each task goes to its own pusher
+        virtual void run_batch(istream* tasks, const pusher* results,
+            int* rets, size_t count) {
+            for (size_t i = 0; i < count; i++)
+                rets[i] = run(tasks[i], results[i]);
+        }
         virtual ~worker() { }
     };
 
@@ -125,6 +135,16 @@ namespace spitz {
     {
     public:
         virtual int commit_task(istream& result) = 0;
+        // Commits a batch of results, one at a time unless specialized
+        virtual int commit_tasks(istream* results, size_t count) {
+            int r = 0;
+            for (size_t i = 0; i < count; i++) {
+                int ri = commit_task(results[i]);
+                if (ri != 0)
+                    r = ri;
+            }
+            return r;
+        }
         virtual int commit_job(const pusher& final_result) {
             final_result.push(NULL, 0);
             return 0;
@@ -138,12 +158,31 @@ namespace spitz {
         virtual spitz_main *create_spitz_main() { return new spitz_main(); }
         virtual job_manager *create_job_manager(int, const char *[], istream&) = 0;
         virtual worker *create_worker(int, const char *[]) = 0;
+        virtual worker *create_worker_with_data(int argc, const char *argv[],
+            istream&) { return create_worker(argc, argv); }
         virtual committer *create_committer(int, const char *[], istream&) = 0;
+        // Tasks whose results may be reused by other runs
+        virtual bool task_cacheable(istream&) { return false; }
     };
 };
 
 extern spitz::factory *spitz_factory;
 
+/* The optional entry points are exported only if the module defines their
+   macro before including this header, otherwise the runtime falls back to
+   the required ones:
+     SPITZ_WORKER_DATA   spits_worker_new_with_data, the workers are
+                         created with factory::create_worker_with_data
+     SPITZ_TASK_CACHEABLE
+                         spits_task_cacheable, the results of the tasks
+                         accepted by factory::task_cacheable are cached
+     SPITZ_TASK_PRIORITY spits_job_manager_task_priority, the tasks are
+                         ordered by job_manager::task_priority
+     SPITZ_COMMIT_BATCH  spits_committer_commit_pits, the results are
+                         committed in batches by committer::commit_tasks
+     SPITZ_RUN_BATCH     spits_worker_run_batch, the tasks are run in
+                         batches by worker::run_batch */
+
 #ifdef SPITZ_ENTRY_POINT
 
 extern "C" int spits_main(int argc, const char* argv[], spitzrun_t run)
@@ -176,6 +215,18 @@ extern "C" int spits_job_manager_next_task(void *user_data,
     return jm->next_task(task) ? 1 : 0;
 }
 
+#ifdef SPITZ_TASK_PRIORITY
+extern "C" long long int spits_job_manager_task_priority(void *user_data,
+    const void* task, spitssize_t tasksz, long long int taskid)
+{
+    class spitz::job_manager *jm = reinterpret_cast
+        <spitz::job_manager*>(user_data);
+    
+    spitz::istream stask(task, tasksz);
+    return jm->task_priority(stask, taskid);
+}
+#endif
+
 extern "C" void spits_job_manager_finalize(void *user_data)
 {
     class spitz::job_manager *jm = reinterpret_cast
@@ -190,6 +241,17 @@ extern "C" void *spits_worker_new(int argc, const char **argv)
     return reinterpret_cast<void*>(w);
 }
 
+#ifdef SPITZ_WORKER_DATA
+extern "C" void *spits_worker_new_with_data(int argc, const char **argv,
+    const void* data, spitssize_t datasz)
+{
+    spitz::istream sdata(data, datasz);
+    spitz::worker *w = spitz_factory->create_worker_with_data(argc, argv, 
+        sdata);
+    return reinterpret_cast<void*>(w);
+}
+#endif
+
 extern "C" int spits_worker_run(void *user_data, const void* task, 
     spitssize_t tasksz, spitspush_t push_result, 
     spitsctx_t taskctx)
@@ -203,6 +265,27 @@ extern "C" int spits_worker_run(void *user_data, const void* task,
     return w->run(stask, result);
 }
 
+#ifdef SPITZ_RUN_BATCH
+extern "C" int spits_worker_run_batch(void *user_data, spitssize_t count,
+    const void* const tasks[], const spitssize_t tasksz[],
+    spitspush_t push_result, const spitsctx_t taskctx[], int rets[])
+{
+    spitz::worker *w = reinterpret_cast
+        <spitz::worker*>(user_data);
+    
+    std::vector<spitz::istream> stasks;
+    std::vector<spitz::pusher> results;
+    stasks.reserve(count);
+    results.reserve(count);
+    for (spitssize_t i = 0; i < count; i++) {
+        stasks.push_back(spitz::istream(tasks[i], tasksz[i]));
+        results.push_back(spitz::pusher(push_result, taskctx[i]));
+    }
+    w->run_batch(stasks.data(), results.data(), rets, count);
+    return 0;
+}
+#endif
+
 extern "C" void spits_worker_finalize(void *user_data)
 {
     spitz::worker *w = reinterpret_cast
@@ -229,6 +312,22 @@ extern "C" int spits_committer_commit_pit(void *user_data,
     return co->commit_task(sresult);
 }
 
+#ifdef SPITZ_COMMIT_BATCH
+extern "C" int spits_committer_commit_pits(void *user_data,
+    spitssize_t count, const void* const results[], 
+    const spitssize_t resultsz[])
+{
+    spitz::committer *co = reinterpret_cast
+        <spitz::committer*>(user_data);
+    
+    std::vector<spitz::istream> sresults;
+    sresults.reserve(count);
+    for (spitssize_t i = 0; i < count; i++)
+        sresults.push_back(spitz::istream(results[i], resultsz[i]));
+    return co->commit_tasks(sresults.data(), count);
+}
+#endif
+
 extern "C" int spits_committer_commit_job(void *user_data,
     spitspush_t push_final_result, spitsctx_t jobctx)
 {
@@ -247,6 +346,14 @@ extern "C" void spits_committer_finalize(void *user_data)
     delete co;
 }
 
+#ifdef SPITZ_TASK_CACHEABLE
+extern "C" int spits_task_cacheable(const void* task, spitssize_t tasksz)
+{
+    spitz::istream stask(task, tasksz);
+    return spitz_factory->task_cacheable(stask) ? 1 : 0;
+}
+#endif
+
 #ifdef SPITZ_SERIAL_DEBUG
 #include <vector>
 #include <algorithm>
@@ -279,7 +386,11 @@ static int spitz_debug_runner(int argc, const char** argv,
 {
     void* jm = spits_job_manager_new(argc, argv, pjobinfo, jobinfosz);
     void* co = spits_committer_new(argc, argv, pjobinfo, jobinfosz);
+#ifdef SPITZ_WORKER_DATA
+    void* wk = spits_worker_new_with_data(argc, argv, pjobinfo, jobinfosz);
+#else
     void* wk = spits_worker_new(argc, argv);
+#endif
     
     static int64_t jid = 0;
     int64_t tid = 0;
@@ -27,6 +27,7 @@
 #define __SPITZ_CPP_STREAM_HPP__
 
 #include <stdint.h>
+#include <string.h>
 #include <arpa/inet.h>
 
 #include <vector>
@@ -37,7 +38,73 @@
 #include <algorithm>
 
 namespace spitz {
-    
+
+    // Copy n values of the given width swapping their byte order, the
+    // fixed width loops are vectorized by the compiler
+    template<size_t W> struct bswap_copy;
+
+    template<> struct bswap_copy<1>
+    {
+        static void apply(void* dst, const void* src, size_t n)
+        {
+            memcpy(dst, src, n);
+        }
+    };
+
+    template<> struct bswap_copy<2>
+    {
+        static void apply(void* dst, const void* src, size_t n)
+        {
+            uint8_t *d = reinterpret_cast<uint8_t*>(dst);
+            const uint8_t *s = reinterpret_cast<const uint8_t*>(src);
+            for (size_t i = 0; i < n; i++, d += 2, s += 2) {
+                uint16_t x;
+                memcpy(&x, s, 2);
+                x = ntohs(x);
+                memcpy(d, &x, 2);
+            }
+        }
+    };
+
+    template<> struct bswap_copy<4>
+    {
+        static void apply(void* dst, const void* src, size_t n)
+        {
+            uint8_t *d = reinterpret_cast<uint8_t*>(dst);
+            const uint8_t *s = reinterpret_cast<const uint8_t*>(src);
+            for (size_t i = 0; i < n; i++, d += 4, s += 4) {
+                uint32_t x;
+                memcpy(&x, s, 4);
+                x = ntohl(x);
+                memcpy(d, &x, 4);
+            }
+        }
+    };
+
+    template<> struct bswap_copy<8>
+    {
+        static void apply(void* dst, const void* src, size_t n)
+        {
+            uint8_t *d = reinterpret_cast<uint8_t*>(dst);
+            const uint8_t *s = reinterpret_cast<const uint8_t*>(src);
+            for (size_t i = 0; i < n; i++, d += 8, s += 8) {
+                uint64_t x;
+                memcpy(&x, s, 8);
+#if defined(__GNUC__)
+                x = __builtin_bswap64(x);
+#else
+                x = (x >> 56) | ((x >> 40) & 0xFF00ULL) |
+                    ((x >> 24) & 0xFF0000ULL) |
+                    ((x >> 8) & 0xFF000000ULL) |
+                    ((x << 8) & 0xFF00000000ULL) |
+                    ((x << 24) & 0xFF0000000000ULL) |
+                    ((x << 40) & 0xFF000000000000ULL) | (x << 56);
+#endif
+                memcpy(d, &x, 8);
+            }
+        }
+    };
+
     class ostream 
     {
     private:
@@ -61,6 +128,18 @@ namespace spitz {
             reinterpret_cast<T*>(this->pdata.data()+s)[0] = v;
         }
         
+        template<typename T> void push_array(const T* v, size_t n)
+        {
+            size_t s = this->pdata.size();
+            this->pdata.resize(s + n * sizeof(T));
+            if (n == 0)
+                return;
+            if (htons(1) == 1)
+                memcpy(this->pdata.data() + s, v, n * sizeof(T));
+            else
+                bswap_copy<sizeof(T)>::apply(this->pdata.data() + s, v, n);
+        }
+        
         template<typename T> uint16_t hton16(const T& v)
         {
             return htons(reinterpret_cast<const uint16_t*>(&v)[0]);
@@ -93,14 +172,40 @@ namespace spitz {
         void write_string(const std::string& v)
         { 
             const char *p = v.c_str();
-            do { write_char(*p); } 
-            while (*p++);
+            write_data(p, strlen(p) + 1);
         }
         void write_data(const void* pdata, size_t size)
         {
-            std::copy(reinterpret_cast<const uint8_t*>(pdata), 
-                reinterpret_cast<const uint8_t*>(pdata) + size, 
-                std::back_inserter(this->pdata));
+            push_array(reinterpret_cast<const uint8_t*>(pdata), size);
+        }
+
+        // Write n values at once, the count itself is not written
+        void write_array(const bool* v, size_t n)
+        {
+            size_t s = this->pdata.size();
+            this->pdata.resize(s + n);
+            for (size_t i = 0; i < n; i++)
+                this->pdata[s + i] = v[i] ? 1 : 0;
+        }
+        void write_array(const int8_t* v, size_t n) { push_array(v, n); }
+        void write_array(const uint8_t* v, size_t n) { push_array(v, n); }
+        void write_array(const float* v, size_t n) { push_array(v, n); }
+        void write_array(const double* v, size_t n) { push_array(v, n); }
+        void write_array(const int16_t* v, size_t n) { push_array(v, n); }
+        void write_array(const uint16_t* v, size_t n) { push_array(v, n); }
+        void write_array(const int32_t* v, size_t n) { push_array(v, n); }
+        void write_array(const uint32_t* v, size_t n) { push_array(v, n); }
+        void write_array(const int64_t* v, size_t n) { push_array(v, n); }
+        void write_array(const uint64_t* v, size_t n) { push_array(v, n); }
+        template<typename T> void write_array(const std::vector<T>& v)
+        {
+            write_array(v.data(), v.size());
+        }
+
+        // Reserve memory for a stream of size bytes
+        void reserve(size_t size)
+        {
+            this->pdata.reserve(size);
         }
         
         ostream& operator<<(const float& v)       { write_float(v); return *this; }
@@ -169,12 +274,25 @@ namespace spitz {
             return v;
         }
         
-        void ensure_size(size_t n)
+        void ensure_size(size_t n) const
         {
             if (this->sz - this->pos < n)
                 throw std::exception();
         }
 
+        template<typename T> void get_array(T* v, size_t n)
+        {
+            if (n > (this->sz - this->pos) / sizeof(T))
+                throw std::exception();
+            if (n == 0)
+                return;
+            if (ntohs(1) == 1)
+                memcpy(v, this->pdata + this->pos, n * sizeof(T));
+            else
+                bswap_copy<sizeof(T)>::apply(v, this->pdata + this->pos, n);
+            this->pos += n * sizeof(T);
+        }
+
     public:
         istream() : 
             pdata(reinterpret_cast<const uint8_t*>(0)), 
@@ -203,20 +321,64 @@ namespace spitz {
         uint64_t read_ulonglong() { return ntoh64(get_as<uint64_t>()); }
         std::string read_string()
         { 
-            std::stringstream ss;
-            char c;
-            while((c = read_char()))
-                ss << c;
-            return ss.str();
+            const char *p = reinterpret_cast<const char*>(this->pdata) + 
+                this->pos;
+            const void *end = memchr(p, 0, this->sz - this->pos);
+            if (end == NULL)
+                throw std::exception();
+            size_t len = reinterpret_cast<const char*>(end) - p;
+            this->pos += len + 1;
+            return std::string(p, len);
         }
         void read_data(void* pdata, size_t size)
+        {
+            get_array(reinterpret_cast<uint8_t*>(pdata), size);
+        }
+
+        // Pointer to the next size bytes in the stream, without copying,
+        // valid while the stream data is
+        const void* read_view(size_t size)
         {
             ensure_size(size);
-            
-            std::copy(this->pdata + this->pos, this->pdata + this->pos + size, 
-                reinterpret_cast<uint8_t*>(pdata));
-            
+            const void *p = this->pdata + this->pos;
             this->pos += size;
+            return p;
+        }
+
+        // Same as read_view, without advancing the stream
+        const void* peek(size_t size) const
+        {
+            ensure_size(size);
+            return this->pdata + this->pos;
+        }
+
+        void skip(size_t size)
+        {
+            ensure_size(size);
+            this->pos += size;
+        }
+
+        // Read n values at once into v
+        void read_array(bool* v, size_t n)
+        {
+            ensure_size(n);
+            for (size_t i = 0; i < n; i++)
+                v[i] = this->pdata[this->pos + i] ? true : false;
+            this->pos += n;
+        }
+        void read_array(int8_t* v, size_t n) { get_array(v, n); }
+        void read_array(uint8_t* v, size_t n) { get_array(v, n); }
+        void read_array(float* v, size_t n) { get_array(v, n); }
+        void read_array(double* v, size_t n) { get_array(v, n); }
+        void read_array(int16_t* v, size_t n) { get_array(v, n); }
+        void read_array(uint16_t* v, size_t n) { get_array(v, n); }
+        void read_array(int32_t* v, size_t n) { get_array(v, n); }
+        void read_array(uint32_t* v, size_t n) { get_array(v, n); }
+        void read_array(int64_t* v, size_t n) { get_array(v, n); }
+        void read_array(uint64_t* v, size_t n) { get_array(v, n); }
+        template<typename T> void read_array(std::vector<T>& v)
+        {
+            read_array(v.data(), v.size());
         }
 
         istream& operator>>(float& v)       { v = read_float(); return *this; }